@@ -10,17 +10,40 @@
 
 from flask import (
     Flask, render_template, jsonify, request,
-    session, redirect, url_for, abort
+    session, redirect, url_for, abort, Response, g, has_request_context
 )
-from waitress import serve
+from flask.logging import default_handler
 import sqlite3
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+import hashlib
+import time
+import json
+import re
+import queue
+import atexit
+import hmac
+import gzip
+import zlib
+import glob
+import tempfile
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from collections import OrderedDict
 from contextlib import closing
 from functools import wraps
+from pathlib import Path
 from datetime import datetime, timedelta
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import check_password_hash, generate_password_hash, safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+try:   # opcional: si está instalado se prefiere br sobre gzip
+    import brotli
+except ImportError:
+    brotli = None
 
 # -----------------------------------------------------------------------------
 # CONFIG
@@ -30,32 +53,1635 @@ app = Flask(__name__)
 app.config["SECRET_KEY"] = "cambiame-bien-largo-y-aleatorio"
 # Duración de sesión cuando marcan “Mantener sesión”
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=8)
+# Clave que piden los endpoints de edición (mover / editar / crear tareas)
+CLAVE_EDICION = "Sanlorenzo"
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'db', 'telecontrol.sqlite')
+DB_PATH = os.environ.get("DB_PATH") or os.path.join(BASE_DIR, 'db', 'telecontrol.sqlite')
 
 # Logs
+# Con LOG_ASYNC=1 (default) el request solo encola el registro; formateo,
+# escritura y rotación del archivo corren en un hilo aparte (QueueListener).
+# Si la cola se llena, los registros se descartan y se cuentan.
+# Directorio y handlers se crean en configurar_logs() (arranque), no al importar.
 LOG_DIR = os.path.join(BASE_DIR, "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-file_handler = RotatingFileHandler(os.path.join(LOG_DIR, "app.log"),
-                                   maxBytes=1_000_000, backupCount=5)
-fmt = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-file_handler.setFormatter(fmt); file_handler.setLevel(logging.INFO)
-console = logging.StreamHandler(); console.setFormatter(fmt); console.setLevel(logging.INFO)
-app.logger.setLevel(logging.INFO); app.logger.addHandler(file_handler); app.logger.addHandler(console)
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "1") == "1"
+LOG_COLA_MAX = int(os.environ.get("LOG_COLA_MAX", "10000"))
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "texto")   # 'texto' | 'json'
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro (para ingestión en herramientas de logs)."""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+class ColaLogHandler(QueueHandler):
+    """
+    QueueHandler que no bloquea ni formatea en el hilo del request. El mensaje
+    (%-args) se arma recién en el hilo del listener; para que salga con el
+    valor del momento del log, los argumentos mutables (listas, dicts, objetos)
+    se congelan como texto al encolar. Los escalares viajan tal cual.
+    """
+
+    INMUTABLES = (str, int, float, bool, bytes, type(None))
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+        self._descartados_lock = threading.Lock()
+
+    @classmethod
+    def _congelar(cls, valor):
+        return valor if isinstance(valor, cls.INMUTABLES) else str(valor)
+
+    def prepare(self, record):
+        # La cola es en proceso: el registro viaja tal cual, salvo los args
+        if isinstance(record.args, dict):
+            record.args = {k: self._congelar(v) for k, v in record.args.items()}
+        elif record.args:
+            record.args = tuple(self._congelar(v) for v in record.args)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._descartados_lock:   # se encola desde varios hilos de request
+                self.descartados += 1
+
+app.logger.setLevel(logging.INFO)
+log_handler = None
+_logs_lock = threading.Lock()
+_logs_listos = False
+
+def configurar_logs():
+    """Archivo rotativo + consola (idempotente). Hasta entonces Flask loguea por stderr."""
+    global log_handler, _logs_listos
+    with _logs_lock:
+        if _logs_listos:
+            return
+        _logs_listos = True
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(os.path.join(LOG_DIR, "app.log"),
+                                       maxBytes=1_000_000, backupCount=5, encoding="utf-8")
+    fmt = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    file_handler.setFormatter(fmt); file_handler.setLevel(logging.INFO)
+    console = logging.StreamHandler(); console.setFormatter(fmt); console.setLevel(logging.INFO)
+    app.logger.removeHandler(default_handler)   # si no, cada línea sale dos veces por consola
+    app.logger.propagate = False   # waitress.serve() hace basicConfig() en el logger raíz
+
+    if LOG_ASYNC:
+        handler = ColaLogHandler(queue.Queue(LOG_COLA_MAX))
+        listener = QueueListener(handler.queue, file_handler, console, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)   # vacía la cola al salir
+        app.logger.addHandler(handler)
+        log_handler = handler
+    else:
+        app.logger.addHandler(file_handler); app.logger.addHandler(console)
+
+def log_stats() -> dict:
+    if log_handler is None:
+        return {"async": False, "configurado": _logs_listos}
+    return {"async": True, "en_cola": log_handler.queue.qsize(), "cola_max": LOG_COLA_MAX,
+            "descartados": log_handler.descartados}
 
 # -----------------------------------------------------------------------------
-# DB
+# DB (pool de conexiones)
 # -----------------------------------------------------------------------------
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Las conexiones se reusan entre requests: los PRAGMAs se ejecutan una sola vez
+# por conexión. check_same_thread=False porque una conexión puede pasar de un
+# hilo de waitress a otro (nunca está en dos hilos a la vez).
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))          # seg. esperando conexión libre
+DB_POOL_HEALTHCHECK = float(os.environ.get("DB_POOL_HEALTHCHECK", "30"))  # seg. ociosa antes de re-chequear
+# mmap: las lecturas van directo al page cache del SO (sin copiar al de SQLite);
+# cache_size: páginas propias por conexión (se multiplica por DB_POOL_SIZE)
+DB_MMAP_MB = int(os.environ.get("DB_MMAP_MB", "256"))
+DB_CACHE_MB = int(os.environ.get("DB_CACHE_MB", "8"))
+
+def _abrir_conexion():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=ConexionMedida)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA busy_timeout=5000;")
     conn.execute("PRAGMA foreign_keys=ON;")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_MB * 1048576};")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_MB * 1024};")   # negativo = KiB
+    ensure_schema(conn)
+    # Primer uso de la base: arranca copia de lectura / checkpoints (idempotente)
+    mantenimiento_db.iniciar()
     return conn
 
+class PoolTimeout(sqlite3.OperationalError):
+    """No se liberó ninguna conexión dentro de DB_POOL_TIMEOUT."""
+
+class ConnectionPool:
+    """Pool LIFO acotado de conexiones SQLite, con métricas de espera y uso."""
+
+    def __init__(self, factory, size: int, timeout: float, healthcheck: float):
+        self._factory = factory
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.healthcheck = healthcheck
+        self._idle = []          # [(conn, monotonic del último uso)]
+        self._abiertas = 0
+        self._cond = threading.Condition()
+        # métricas
+        self.checkouts = 0
+        self.esperas = 0
+        self.timeouts = 0
+        self.descartadas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.uso_total = 0.0
+        self.uso_max = 0.0
+        self.cerrado = False
+
+    @staticmethod
+    def _sana(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._abiertas -= 1
+            self.descartadas += 1
+            self._cond.notify()
+
+    def acquire(self):
+        t0 = time.perf_counter()
+        limite = time.monotonic() + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, ultimo_uso = self._idle.pop()
+                    break
+                if self._abiertas < self.size:
+                    self._abiertas += 1
+                    ultimo_uso = None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"Sin conexiones libres tras {self.timeout:.1f}s (pool={self.size})")
+                self.esperas += 1
+                self._cond.wait(restante)
+
+        if conn is not None and time.monotonic() - ultimo_uso > self.healthcheck and not self._sana(conn):
+            self._cerrar(conn)
+            with self._cond:
+                self._abiertas += 1
+            conn = None
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._abiertas -= 1
+                    self._cond.notify()
+                raise
+
+        espera = time.perf_counter() - t0
+        with self._cond:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+        return conn
+
+    def release(self, conn, uso: float = 0.0, descartar: bool = False):
+        descartar = descartar or self.cerrado
+        if not descartar and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                descartar = True
+        if descartar:
+            self._cerrar(conn)
+            return
+        with self._cond:
+            self.uso_total += uso
+            self.uso_max = max(self.uso_max, uso)
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def precalentar(self) -> int:
+        """
+        Abre las conexiones que faltan y las deja libres. Reserva de a un lugar
+        y no presta nada: un request que llega mientras tanto no espera.
+        """
+        abiertas = 0
+        while True:
+            with self._cond:
+                if self.cerrado or self._abiertas >= self.size:
+                    return abiertas
+                self._abiertas += 1
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._abiertas -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            abiertas += 1
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._cond:
+            self.cerrado = True
+            libres, self._idle = self._idle, []
+        for conn, _ in libres:
+            self._cerrar(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            n = self.checkouts or 1
+            return {
+                "size": self.size,
+                "abiertas": self._abiertas,
+                "libres": len(self._idle),
+                "checkouts": self.checkouts,
+                "esperas": self.esperas,
+                "timeouts": self.timeouts,
+                "descartadas": self.descartadas,
+                "espera_prom_ms": round(self.espera_total / n * 1000, 3),
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "uso_prom_ms": round(self.uso_total / n * 1000, 3),
+                "uso_max_ms": round(self.uso_max * 1000, 3),
+            }
+
+class _Prestamo:
+    """
+    Context manager de get_connection(): igual que 'with sqlite3.connect()'
+    (commit si no hubo error, rollback si hubo), pero al salir devuelve la
+    conexión al pool en lugar de dejarla abierta.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._conn = None
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._conn = self._pool.acquire()
+        self._t0 = time.perf_counter()
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        descartar = False
+        try:
+            if exc_type is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        except sqlite3.Error:
+            descartar = True
+            if exc_type is None:
+                raise
+        finally:
+            self._pool.release(conn, time.perf_counter() - self._t0, descartar)
+        return False
+
+db_pool = ConnectionPool(_abrir_conexion, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK)
+
+def get_connection():
+    """Uso: 'with get_connection() as conn:' (la conexión vuelve al pool al salir)."""
+    return _Prestamo(db_pool)
+
+# -----------------------------------------------------------------------------
+# DB: COPIA DE LECTURA (snapshot) Y CHECKPOINTS DEL WAL
+# -----------------------------------------------------------------------------
+# Con SNAPSHOT_LECTURA=memoria|archivo los endpoints de solo lectura (feeds,
+# búsqueda, estadísticas, catálogos) leen de una copia hecha con la API de
+# backup de SQLite, así los feeds largos no retienen marcas de lectura en el
+# WAL de la primaria y los checkpoints pueden avanzar. Escrituras, login,
+# detalle de tarea y /api/tareas/changes siguen en la primaria.
+# - La copia se rehace cuando cambia la primaria (escrituras propias o externas,
+#   vía PRAGMA data_version), como mucho una vez cada SNAPSHOT_MIN_SEG.
+# - Una copia desactualizada se sigue usando hasta SNAPSHOT_MAX_SEG; pasado ese
+#   plazo las lecturas vuelven a la primaria hasta que esté la nueva.
+# - Tras una escritura de la propia app se lee de la primaria hasta que haya
+#   una copia que la incluya (se resuelve en el servidor, no en el cliente:
+#   cualquier refetch posterior ve el cambio). Los cambios externos sí
+#   esperan a la copia, dentro de SNAPSHOT_MAX_SEG.
+# - Cada request queda fijado a una generación: ETag, token de sync y datos
+#   salen de la misma copia (los deltas de la primaria completan el resto).
+SNAPSHOT_LECTURA = os.environ.get("SNAPSHOT_LECTURA", "").lower()   # '' | 'memoria' | 'archivo'
+SNAPSHOT_MAX_SEG = float(os.environ.get("SNAPSHOT_MAX_SEG", "5"))
+SNAPSHOT_MIN_SEG = float(os.environ.get("SNAPSHOT_MIN_SEG", "1"))
+# Checkpoint periódico (PASSIVE) de la primaria; si el WAL supera WAL_ALARMA_MB
+# se loguea una alarma y se fuerza un TRUNCATE.
+WAL_CHECKPOINT_SEG = float(os.environ.get("WAL_CHECKPOINT_SEG", "60"))   # 0 = solo el autocheckpoint de SQLite
+WAL_ALARMA_MB = float(os.environ.get("WAL_ALARMA_MB", "64"))
+# Cada cuánto se recorta tarea_cambio a los últimos CAMBIOS_RETENCION cambios
+CAMBIOS_PODA_SEG = float(os.environ.get("CAMBIOS_PODA_SEG", "300"))   # 0 = solo al arrancar
+
+class _Snapshot:
+    """Una generación de la copia de lectura, con su propio pool de conexiones."""
+
+    def __init__(self, gen: int, modo: str):
+        self.gen = gen
+        self.creada = time.monotonic()
+        self.refs = 0      # requests/streams que la tienen fijada
+        self.bytes = 0
+        self.version_tarea = 0
+        if modo == "memoria":
+            self.ruta = None
+            self.uri = f"file:lectura-{gen}?mode=memory&cache=shared"
+            # Una base en memoria compartida vive mientras quede una conexión: el ancla
+            self.ancla = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        else:
+            self.ruta = f"{DB_PATH}.lectura-{gen}"
+            self.uri = Path(self.ruta).resolve().as_uri() + "?mode=ro&immutable=1"
+            self.ancla = sqlite3.connect(self.ruta, check_same_thread=False)
+        self.pool = ConnectionPool(self._abrir, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK)
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False, factory=ConexionMedida)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=1;")
+        return conn
+
+    def copiar_de(self, fuente):
+        fuente.backup(self.ancla)
+        if self.ruta:
+            # En disco queda como base sin WAL: se abre 'immutable', sin locks
+            self.ancla.execute("PRAGMA journal_mode=DELETE;")
+        paginas, tam = (self.ancla.execute(f"PRAGMA {p}").fetchone()[0] for p in ("page_count", "page_size"))
+        self.bytes = paginas * tam
+        # Misma versión que daría la primaria con este contenido: el ETag no cambia de fuente a fuente
+        with closing(self.ancla.cursor()) as cursor:
+            self.version_tarea = token_cambios(cursor)
+
+    def cerrar(self):
+        self.pool.cerrar()
+        try:
+            self.ancla.close()
+        except sqlite3.Error:
+            pass
+        if self.ruta:
+            for ruta in (self.ruta, self.ruta + "-journal"):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+class CopiaLectura:
+    """Genera y publica las copias de lectura; las viejas se cierran al quedar sin uso."""
+
+    def __init__(self, modo: str, max_seg: float, min_seg: float):
+        self.modo = modo
+        self.max_seg = max_seg
+        self.min_seg = min_seg
+        self._lock = threading.Lock()
+        self._actual = None
+        self._retiradas = []
+        self._gen = 0
+        self._cambios = 0
+        self._sucio_desde = None     # monotonic del primer cambio que la copia no tiene
+        self._propio = None          # nº de cambio de la última escritura de la app que la copia no tiene
+        self._data_version = None    # PRAGMA data_version de la primaria al copiar
+        self._ultima = 0.0
+        # métricas
+        self.copias = 0
+        self.errores = 0
+        self.copia_ms = 0.0
+        self.lecturas = 0
+        self.a_primaria = 0
+        if modo == "archivo":
+            # copias que quedaron de una ejecución anterior
+            for ruta in glob.glob(glob.escape(DB_PATH) + ".lectura-*"):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+    def marcar(self, propio: bool = False):
+        """
+        Hubo un commit en la primaria: la copia actual quedó desactualizada.
+        propio=True (escrituras de esta app): hasta que haya una copia que lo
+        incluya se lee de la primaria, así quien escribió y vuelve a pedir el
+        feed (refetchEvents tras crear/mover) ve su cambio y no un 304.
+        """
+        with self._lock:
+            self._cambios += 1
+            if propio:
+                self._propio = self._cambios
+            if self._sucio_desde is None:
+                self._sucio_desde = time.monotonic()
+
+    def tomar(self):
+        """Fija la copia vigente para un request (o None si hay que leer de la primaria)."""
+        with self._lock:
+            snap = self._actual
+            vencida = self._sucio_desde is not None and time.monotonic() - self._sucio_desde > self.max_seg
+            if snap is None or vencida or self._propio is not None:
+                self.a_primaria += 1
+                return None
+            snap.refs += 1
+            self.lecturas += 1
+            return snap
+
+    def soltar(self, snap):
+        with self._lock:
+            snap.refs -= 1
+
+    def ciclo(self, conn):
+        """Una vuelta del hilo de mantenimiento (conn = conexión propia a la primaria)."""
+        dv = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._actual is not None and dv != self._data_version:
+            self.marcar()   # cambio hecho por otra conexión u otro proceso
+        if ((self._actual is None or self._sucio_desde is not None)
+                and time.monotonic() - self._ultima >= self.min_seg):
+            self._copiar(conn, dv)
+        self._limpiar()
+
+    def _copiar(self, conn, dv):
+        with self._lock:
+            marca = self._cambios
+            self._gen += 1
+            gen = self._gen
+        t0 = time.perf_counter()
+        self._ultima = time.monotonic()
+        snap = None
+        try:
+            snap = _Snapshot(gen, self.modo)
+            snap.copiar_de(conn)
+        except Exception:
+            self.errores += 1
+            app.logger.exception("No se pudo generar la copia de lectura (gen %s)", gen)
+            if snap is not None:
+                snap.cerrar()
+            return
+        self.copia_ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            vieja, self._actual = self._actual, snap
+            if vieja is not None:
+                self._retiradas.append(vieja)
+            self._data_version = dv
+            if self._cambios == marca:
+                self._sucio_desde = None
+            # marca se tomó antes del backup: los cambios hasta ahí ya están en la copia
+            if self._propio is not None and self._propio <= marca:
+                self._propio = None
+            self.copias += 1
+        if vieja is not None:
+            vieja.pool.cerrar()
+        app.logger.debug("Copia de lectura gen %s: %.1f MB en %.0f ms",
+                         gen, snap.bytes / 1048576, self.copia_ms)
+
+    def _limpiar(self):
+        with self._lock:
+            libres = [s for s in self._retiradas if s.refs <= 0]
+            self._retiradas = [s for s in self._retiradas if s.refs > 0]
+        for snap in libres:
+            snap.cerrar()
+
+    def cerrar(self):
+        with self._lock:
+            todas = self._retiradas + ([self._actual] if self._actual else [])
+            self._actual, self._retiradas = None, []
+        for snap in todas:
+            snap.cerrar()
+
+    def stats(self) -> dict:
+        with self._lock:
+            snap = self._actual
+            ahora = time.monotonic()
+            return {
+                "modo": self.modo,
+                "generacion": snap.gen if snap else None,
+                "edad_seg": round(ahora - snap.creada, 1) if snap else None,
+                "atraso_seg": round(ahora - self._sucio_desde, 1) if self._sucio_desde else 0,
+                "bytes": snap.bytes if snap else 0,
+                "copias": self.copias,
+                "errores": self.errores,
+                "ultima_copia_ms": round(self.copia_ms, 1),
+                "lecturas": self.lecturas,
+                "a_primaria": self.a_primaria,
+                "retiradas": len(self._retiradas),
+                "max_seg": self.max_seg,
+            }
+
+class CheckpointWAL:
+    """Checkpoint periódico de la primaria y alarma por tamaño del WAL."""
+
+    def __init__(self, cada_seg: float, alarma_mb: float):
+        self.cada_seg = cada_seg
+        self.alarma_bytes = int(alarma_mb * 1048576)
+        self._proximo = 0.0
+        # métricas
+        self.checkpoints = 0
+        self.ocupados = 0       # no pudieron copiar todo el WAL (lectores/escritores activos)
+        self.alarmas = 0
+        self.wal_bytes = 0
+        self.wal_max_bytes = 0
+        self.ultimo = {}
+
+    @staticmethod
+    def _tam_wal() -> int:
+        try:
+            return os.path.getsize(DB_PATH + "-wal")
+        except OSError:
+            return 0
+
+    def ciclo(self, conn):
+        if self.cada_seg <= 0 or time.monotonic() < self._proximo:
+            return
+        self._proximo = time.monotonic() + self.cada_seg
+        wal = self._tam_wal()
+        self.wal_max_bytes = max(self.wal_max_bytes, wal)
+        modo = "PASSIVE"
+        if wal > self.alarma_bytes:
+            self.alarmas += 1
+            app.logger.warning("WAL de %.1f MB (alarma: %.0f MB): se fuerza checkpoint TRUNCATE",
+                               wal / 1048576, self.alarma_bytes / 1048576)
+            modo = "TRUNCATE"
+
+        t0 = time.perf_counter()
+        ocupado, paginas_wal, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        ms = (time.perf_counter() - t0) * 1000
+        self.checkpoints += 1
+        if ocupado or copiadas < paginas_wal:
+            self.ocupados += 1
+            if modo == "TRUNCATE":
+                app.logger.warning("Checkpoint TRUNCATE incompleto: %s/%s páginas (hay lecturas en curso)",
+                                   copiadas, paginas_wal)
+        self.wal_bytes = self._tam_wal()
+        self.ultimo = {"modo": modo, "ocupado": bool(ocupado), "paginas_wal": paginas_wal,
+                       "paginas_copiadas": copiadas, "ms": round(ms, 1)}
+
+    def stats(self) -> dict:
+        return {
+            "cada_seg": self.cada_seg,
+            "checkpoints": self.checkpoints,
+            "ocupados": self.ocupados,
+            "alarmas": self.alarmas,
+            "wal_bytes": self._tam_wal(),
+            "wal_max_bytes": self.wal_max_bytes,
+            "alarma_bytes": self.alarma_bytes,
+            "ultimo": self.ultimo,
+        }
+
+class PodaCambios:
+    """Recorte periódico de tarea_cambio (sin esto solo se poda al arrancar)."""
+
+    def __init__(self, cada_seg: float):
+        self.cada_seg = cada_seg
+        self._proximo = time.monotonic() + cada_seg   # al arrancar ya podó ensure_schema
+        # métricas
+        self.podas = 0
+        self.borrados = 0
+        self.ultimo = {}
+
+    def ciclo(self, conn):
+        if self.cada_seg <= 0 or time.monotonic() < self._proximo:
+            return
+        self._proximo = time.monotonic() + self.cada_seg
+        t0 = time.perf_counter()
+        borrados = podar_cambios(conn)
+        self.podas += 1
+        self.borrados += borrados
+        self.ultimo = {"borrados": borrados, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        if borrados:
+            app.logger.debug("tarea_cambio: %s cambios viejos eliminados", borrados)
+
+    def stats(self) -> dict:
+        return {"cada_seg": self.cada_seg, "retencion": CAMBIOS_RETENCION, "podas": self.podas,
+                "borrados": self.borrados, "ultimo": self.ultimo}
+
+class MantenimientoDB:
+    """Un solo hilo, con conexión propia, para la copia de lectura, los checkpoints y la poda de cambios."""
+
+    TICK = 0.5   # seg. entre vueltas (una escritura propia lo despierta antes)
+
+    def __init__(self, copia, checkpoint: CheckpointWAL, poda: PodaCambios):
+        self.copia = copia
+        self.checkpoint = checkpoint
+        self.poda = poda
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._parar = False
+
+    def iniciar(self):
+        if self._hilo is not None or (self.copia is None and self.checkpoint.cada_seg <= 0
+                                      and self.poda.cada_seg <= 0):
+            return
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._correr, name="mantenimiento-db", daemon=True)
+            self._hilo.start()
+        app.logger.info("Mantenimiento DB: copia de lectura=%s | checkpoint cada %ss | alarma WAL %s MB"
+                        " | poda de cambios cada %ss",
+                        self.copia.modo if self.copia else "no", self.checkpoint.cada_seg, WAL_ALARMA_MB,
+                        self.poda.cada_seg)
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _correr(self):
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=2000;")
+        try:
+            while not self._parar:
+                if self.copia is not None:
+                    try:
+                        self.copia.ciclo(conn)
+                    except Exception:
+                        app.logger.exception("Error en la copia de lectura")
+                try:
+                    self.checkpoint.ciclo(conn)
+                except Exception:
+                    app.logger.exception("Error en el checkpoint del WAL")
+                try:
+                    self.poda.ciclo(conn)
+                except Exception:
+                    app.logger.exception("Error podando tarea_cambio")
+                self._despertar.wait(self.TICK)
+                self._despertar.clear()
+        finally:
+            conn.close()
+
+    def detener(self):
+        self._parar = True
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        if self.copia is not None:
+            self.copia.cerrar()
+
+if SNAPSHOT_LECTURA and SNAPSHOT_LECTURA not in ("memoria", "archivo"):
+    app.logger.warning("SNAPSHOT_LECTURA=%s no reconocido (memoria|archivo): se lee de la primaria",
+                       SNAPSHOT_LECTURA)
+copia_lectura = (CopiaLectura(SNAPSHOT_LECTURA, SNAPSHOT_MAX_SEG, SNAPSHOT_MIN_SEG)
+                 if SNAPSHOT_LECTURA in ("memoria", "archivo") else None)
+checkpoint_wal = CheckpointWAL(WAL_CHECKPOINT_SEG, WAL_ALARMA_MB)
+poda_cambios = PodaCambios(CAMBIOS_PODA_SEG)
+mantenimiento_db = MantenimientoDB(copia_lectura, checkpoint_wal, poda_cambios)
+atexit.register(mantenimiento_db.detener)
+
+def fuente_lectura():
+    """Copia fijada para las lecturas de este request (None = primaria); se elige en la primera llamada."""
+    if copia_lectura is None or not has_request_context():
+        return None
+    if "fuente_lectura" not in g:
+        g.fuente_lectura = copia_lectura.tomar()
+    return g.fuente_lectura
+
+@app.teardown_request
+def _soltar_lectura(exc):
+    snap = g.pop("fuente_lectura", None)
+    if snap is not None:
+        copia_lectura.soltar(snap)
+
+def get_read_connection():
+    """Como get_connection(), para consultas de solo lectura: usa la copia fijada para el request si la hay."""
+    snap = fuente_lectura()
+    return _Prestamo(snap.pool if snap else db_pool)
+
+# -----------------------------------------------------------------------------
+# MÉTRICAS (latencia por endpoint, SQL, bytes → /metrics en formato Prometheus)
+# -----------------------------------------------------------------------------
+# Cada request arma una _Medicion (thread-local) que van llenando los cursores;
+# al cerrar la respuesta (también las transmitidas por partes) se vuelca en los
+# histogramas por endpoint.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))   # 0 = sin log de consultas lentas
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Sin token, /metrics responde 403 a todos. Pedidos desde localhost sin token
+# solo si se habilita a propósito: detrás de un proxy en la misma máquina
+# cualquier cliente de afuera llegaría como 127.0.0.1.
+METRICS_LOCALHOST = os.environ.get("METRICS_LOCALHOST", "0") == "1"
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SQL = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+
+# Conexiones largas (SSE): se cuentan, pero no entran al histograma de latencia
+SIN_LATENCIA = {"api_stream"}
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.cuentas = [0] * len(buckets)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.suma += valor
+        self.total += 1
+        i = bisect_left(self.buckets, valor)
+        if i < len(self.cuentas):
+            self.cuentas[i] += 1
+
+    def lineas(self, nombre: str, etiquetas: str):
+        acum = 0
+        for b, n in zip(self.buckets, self.cuentas):
+            acum += n
+            yield f'{nombre}_bucket{{{etiquetas},le="{b}"}} {acum}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.total}'
+        yield f"{nombre}_sum{{{etiquetas}}} {round(self.suma, 6)}"
+        yield f'{nombre}_count{{{etiquetas}}} {self.total}'
+
+class _Medicion:
+    __slots__ = ("endpoint", "metodo", "t0", "status", "bytes", "sentencias", "sql_seg", "filas", "lentas")
+
+    def __init__(self, endpoint: str, metodo: str):
+        self.endpoint = endpoint
+        self.metodo = metodo
+        self.t0 = time.perf_counter()
+        self.status = 0
+        self.bytes = 0
+        self.sentencias = []   # duración de cada execute
+        self.sql_seg = 0.0     # execute + fetch
+        self.filas = 0
+        self.lentas = 0
+
+    def contar(self, iterable):
+        """Envuelve el cuerpo de una respuesta transmitida para sumar los bytes enviados."""
+        for chunk in iterable:
+            self.bytes += len(chunk)
+            yield chunk
+
+_medicion_actual = threading.local()
+
+def _medicion():
+    return getattr(_medicion_actual, "m", None)
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}       # (endpoint, método, status) → cantidad
+        self.latencia = {}       # endpoint → Histograma (seg.)
+        self.bytes = {}          # endpoint → Histograma (bytes del cuerpo)
+        self.sql = {}            # endpoint → Histograma (seg. por sentencia)
+        self.sql_segundos = {}   # endpoint → seg. totales en SQLite (execute + fetch)
+        self.filas = {}          # endpoint → filas leídas
+        self.lentas = {}         # endpoint → consultas sobre SLOW_QUERY_MS
+
+    def registrar(self, med: _Medicion, segundos: float):
+        ep = med.endpoint
+        with self._lock:
+            clave = (ep, med.metodo, med.status)
+            self.requests[clave] = self.requests.get(clave, 0) + 1
+            if ep not in SIN_LATENCIA:
+                self.latencia.setdefault(ep, Histograma(BUCKETS_LATENCIA)).observar(segundos)
+                self.bytes.setdefault(ep, Histograma(BUCKETS_BYTES)).observar(med.bytes)
+            if med.sentencias:
+                h = self.sql.setdefault(ep, Histograma(BUCKETS_SQL))
+                for d in med.sentencias:
+                    h.observar(d)
+                self.sql_segundos[ep] = self.sql_segundos.get(ep, 0.0) + med.sql_seg
+                self.filas[ep] = self.filas.get(ep, 0) + med.filas
+                self.lentas[ep] = self.lentas.get(ep, 0) + med.lentas
+
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            out.append("# TYPE calendario_http_requests_total counter")
+            for (ep, metodo, status), n in sorted(self.requests.items()):
+                out.append(f'calendario_http_requests_total{{endpoint="{ep}",method="{metodo}",status="{status}"}} {n}')
+            out.append("# TYPE calendario_http_request_duration_seconds histogram")
+            for ep, h in sorted(self.latencia.items()):
+                out.extend(h.lineas("calendario_http_request_duration_seconds", f'endpoint="{ep}"'))
+            out.append("# TYPE calendario_http_response_bytes histogram")
+            for ep, h in sorted(self.bytes.items()):
+                out.extend(h.lineas("calendario_http_response_bytes", f'endpoint="{ep}"'))
+            out.append("# TYPE calendario_sqlite_query_duration_seconds histogram")
+            for ep, h in sorted(self.sql.items()):
+                out.extend(h.lineas("calendario_sqlite_query_duration_seconds", f'endpoint="{ep}"'))
+            out.append("# TYPE calendario_sqlite_seconds_total counter")
+            for ep, v in sorted(self.sql_segundos.items()):
+                out.append(f'calendario_sqlite_seconds_total{{endpoint="{ep}"}} {v:.6f}')
+            out.append("# TYPE calendario_sqlite_rows_total counter")
+            for ep, v in sorted(self.filas.items()):
+                out.append(f'calendario_sqlite_rows_total{{endpoint="{ep}"}} {v}')
+            out.append("# TYPE calendario_sqlite_slow_queries_total counter")
+            for ep, v in sorted(self.lentas.items()):
+                out.append(f'calendario_sqlite_slow_queries_total{{endpoint="{ep}"}} {v}')
+        return "\n".join(out) + "\n"
+
+metricas = Metricas()
+
+def _medir_sql(sql: str, segundos: float):
+    med = _medicion()
+    if med is not None:
+        med.sentencias.append(segundos)
+        med.sql_seg += segundos
+    if SLOW_QUERY_MS and segundos * 1000 >= SLOW_QUERY_MS:
+        if med is not None:
+            med.lentas += 1
+        app.logger.warning("Consulta lenta (%.0f ms) en %s: %.300s",
+                           segundos * 1000, med.endpoint if med else "-", " ".join(sql.split()))
+
+def _medir_fetch(filas: int, segundos: float):
+    med = _medicion()
+    if med is not None:
+        med.filas += filas
+        med.sql_seg += segundos
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que mide cada sentencia. En SQLite execute() ya calcula la primera
+    fila (y ordena/agrupa si hace falta): es lo que va al histograma y al log de
+    lentas. El tiempo de fetch se suma al total por endpoint.
+    """
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            _medir_sql(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, seq):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            _medir_sql(sql, time.perf_counter() - t0)
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        _medir_fetch(0 if row is None else 1, time.perf_counter() - t0)
+        return row
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _medir_fetch(len(rows), time.perf_counter() - t0)
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        _medir_fetch(len(rows), time.perf_counter() - t0)
+        return rows
+
+class ConexionMedida(sqlite3.Connection):
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+@app.before_request
+def _iniciar_medicion():
+    _medicion_actual.m = _Medicion(request.endpoint or "sin_ruta", request.method)
+
+@app.after_request
+def _cerrar_medicion(resp):
+    med = _medicion()
+    if med is None:
+        return resp
+    med.status = resp.status_code
+    if resp.is_streamed and not resp.direct_passthrough:
+        resp.response = med.contar(resp.response)
+    else:
+        med.bytes = resp.content_length or 0
+
+    def fin():
+        metricas.registrar(med, time.perf_counter() - med.t0)
+        if _medicion() is med:
+            _medicion_actual.m = None
+    resp.call_on_close(fin)
+    return resp
+
+# -----------------------------------------------------------------------------
+# ESQUEMA: migraciones idempotentes (índices, tablas auxiliares, triggers)
+# -----------------------------------------------------------------------------
+# Se aplican una sola vez por proceso (IF NOT EXISTS → idempotentes).
+
+# UT sin guiones ni espacios, en mayúsculas (centro / seccionador)
+UT_NORM_SQL = """UPPER(REPLACE(REPLACE(CAST("Ubicac.técnica" AS TEXT),'-',''),' ',''))"""
+
+MIGRACIONES = [
+    # Rango por fecha para los feeds; con tarea/estado también cubre /api/stats
+    "CREATE INDEX IF NOT EXISTS idx_tarea_fecha_tarea_estado ON tarea(fecha, tarea, estado)",
+    "DROP INDEX IF EXISTS idx_tarea_fecha",   # reemplazado por el anterior (mismo prefijo)
+    "CREATE INDEX IF NOT EXISTS idx_ausencia_fecha ON ausencia(fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_feriado_fecha ON feriado(fecha)",
+    # Log de cambios de 'tarea' para la sincronización incremental. Lo llenan
+    # triggers, así queda registrado también lo que se edite por fuera de la app.
+    """CREATE TABLE IF NOT EXISTS tarea_cambio (
+           id_cambio    INTEGER PRIMARY KEY AUTOINCREMENT,
+           id_tarea     INTEGER NOT NULL,
+           op           TEXT NOT NULL,   -- 'I' alta, 'U' modificación, 'D' baja
+           fecha_cambio TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_tarea_cambio_ins AFTER INSERT ON tarea BEGIN
+           INSERT INTO tarea_cambio (id_tarea, op) VALUES (NEW.id_tarea, 'I');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_tarea_cambio_upd AFTER UPDATE ON tarea BEGIN
+           INSERT INTO tarea_cambio (id_tarea, op) VALUES (NEW.id_tarea, 'U');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_tarea_cambio_del AFTER DELETE ON tarea BEGIN
+           INSERT INTO tarea_cambio (id_tarea, op) VALUES (OLD.id_tarea, 'D');
+       END""",
+    # /api/ubicacion_lookup filtra por la UT normalizada: índice de expresión
+    # (la consulta usa exactamente la misma expresión → búsqueda por índice).
+    f'CREATE INDEX IF NOT EXISTS idx_seccionador_ut_norm ON seccionador({UT_NORM_SQL})',
+    f'CREATE INDEX IF NOT EXISTS idx_centro_ut_norm ON centro({UT_NORM_SQL})',
+    # /api/cromo: filtro por Lado normalizado + join cromo→ruta por UT como texto
+    "CREATE INDEX IF NOT EXISTS idx_cromo_lado_norm ON cromo(REPLACE(REPLACE(Lado,'-',''),' ',''))",
+    "CREATE INDEX IF NOT EXISTS idx_ruta_ut_text ON ruta(CAST(UT AS TEXT))",
+    # Login case-insensitive: get_usuario_por_nombre filtra por UPPER(nombre_usuario)
+    "CREATE INDEX IF NOT EXISTS idx_usuario_nombre_upper ON usuario(UPPER(nombre_usuario))",
+    # Contador de cambios por tabla (feriado / ausencia) para recargar los calendarios anuales
+    """CREATE TABLE IF NOT EXISTS tabla_version (
+           tabla   TEXT PRIMARY KEY,
+           version INTEGER NOT NULL DEFAULT 0
+       )""",
+    "INSERT OR IGNORE INTO tabla_version (tabla, version) VALUES ('feriado', 0), ('ausencia', 0)",
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_{op.lower()} AFTER {op} ON {tabla} BEGIN
+            UPDATE tabla_version SET version = version + 1 WHERE tabla = '{tabla}';
+        END"""
+    for tabla in ("feriado", "ausencia") for op in ("INSERT", "UPDATE", "DELETE")
+]
+
+# Cambios que se conservan en tarea_cambio; un cliente con un token más viejo
+# recibe reset=true y vuelve a pedir el feed completo.
+CAMBIOS_RETENCION = int(os.environ.get("CAMBIOS_RETENCION", "20000"))
+
+def podar_cambios(conn) -> int:
+    """Borra de tarea_cambio lo que excede CAMBIOS_RETENCION. Devuelve las filas borradas."""
+    cur = conn.execute("""
+        DELETE FROM tarea_cambio
+         WHERE id_cambio <= (SELECT MAX(id_cambio) FROM tarea_cambio) - ?
+    """, (CAMBIOS_RETENCION,))
+    conn.commit()
+    return cur.rowcount
+
+# Búsqueda de texto sobre 'tarea' (FTS5, contenido externo = la propia tabla).
+# Va aparte de MIGRACIONES: sin FTS5 los triggers romperían los INSERT/UPDATE.
+FTS_COLUMNAS = ("ut", "ajuste", "comentario", "lugar", "marca", "modelo", "responsable", "pedido")
+FTS_TAREAS = False   # True si tarea_fts quedó disponible (si no, /api/tareas/search usa LIKE)
+
+def _migrar_fts(conn) -> bool:
+    cols = ", ".join(FTS_COLUMNAS)
+    nuevos = ", ".join(f"NEW.{c}" for c in FTS_COLUMNAS)
+    viejos = ", ".join(f"OLD.{c}" for c in FTS_COLUMNAS)
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tarea_fts USING fts5(
+                {cols}, content='tarea', content_rowid='id_tarea',
+                tokenize='unicode61 remove_diacritics 2'
+            )""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tarea_fts_ins AFTER INSERT ON tarea BEGIN
+                INSERT INTO tarea_fts (rowid, {cols}) VALUES (NEW.id_tarea, {nuevos});
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tarea_fts_del AFTER DELETE ON tarea BEGIN
+                INSERT INTO tarea_fts (tarea_fts, rowid, {cols}) VALUES ('delete', OLD.id_tarea, {viejos});
+            END""")
+        # Solo si cambia alguna columna indexada (mover fecha no reindexa)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tarea_fts_upd AFTER UPDATE OF {cols} ON tarea BEGIN
+                INSERT INTO tarea_fts (tarea_fts, rowid, {cols}) VALUES ('delete', OLD.id_tarea, {viejos});
+                INSERT INTO tarea_fts (rowid, {cols}) VALUES (NEW.id_tarea, {nuevos});
+            END""")
+        # Recién creada, o tareas cargadas por fuera antes de los triggers: reconstruir
+        indexadas = conn.execute("SELECT COUNT(*) FROM tarea_fts_docsize").fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM tarea").fetchone()[0]
+        if indexadas != total:
+            t0 = time.perf_counter()
+            conn.execute("INSERT INTO tarea_fts (tarea_fts) VALUES ('rebuild')")
+            app.logger.info("Índice de búsqueda reconstruido: %s tareas en %.1f s", total, time.perf_counter() - t0)
+        return True
+    except sqlite3.Error as e:
+        app.logger.warning("Búsqueda FTS5 no disponible, se usa LIKE: %s", e)
+        return False
+
+_esquema_listo = False
+_esquema_lock = threading.Lock()
+
+def _objetos_esquema(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+
+def ensure_schema(conn):
+    global _esquema_listo, FTS_TAREAS
+    if _esquema_listo:
+        return
+    with _esquema_lock:
+        if _esquema_listo:
+            return
+        antes = _objetos_esquema(conn)
+        for sql in MIGRACIONES:
+            try:
+                conn.execute(sql)
+            except sqlite3.Error as e:
+                # Tabla inexistente u otra DB: no bloquea el arranque
+                app.logger.warning("Migración omitida (%s): %s", sql, e)
+        FTS_TAREAS = _migrar_fts(conn)
+        try:
+            podar_cambios(conn)
+        except sqlite3.Error:
+            pass
+        conn.commit()
+        nuevos = sorted(_objetos_esquema(conn) - antes)
+        if nuevos:
+            app.logger.info("Migraciones aplicadas: %s", ", ".join(nuevos))
+        _esquema_listo = True
+
+# -----------------------------------------------------------------------------
+# RANGO DE FECHAS (start/end que envía FullCalendar)
+# -----------------------------------------------------------------------------
+def _parse_fecha_param(valor):
+    """'2025-09-29T00:00:00-03:00' → '2025-09-29'. Lanza ValueError si no es una fecha."""
+    return datetime.strptime(valor.strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+
+def rango_fechas():
+    """
+    Devuelve (desde, hasta) según los query params:
+      - ?start=&end=  → rango semiabierto [desde, hasta) (lo que pide FullCalendar)
+      - ?all=1 o sin params → (None, None) = historial completo
+    Lanza ValueError si start/end vienen mal formados.
+    """
+    if request.args.get("all") == "1":
+        return None, None
+    start = request.args.get("start")
+    end = request.args.get("end")
+    desde = _parse_fecha_param(start) if start else None
+    hasta = _parse_fecha_param(end) if end else None
+    return desde, hasta
+
+def where_rango(desde, hasta, col="fecha"):
+    """Arma el WHERE sobre 'fecha' (TEXT 'YYYY-MM-DD[ HH:MM:SS]') para usar el índice."""
+    conds, params = [], []
+    if desde:
+        conds.append(f"{col} >= ?"); params.append(desde)
+    if hasta:
+        conds.append(f"{col} < ?"); params.append(hasta)
+    return (" WHERE " + " AND ".join(conds)) if conds else "", params
+
+# -----------------------------------------------------------------------------
+# VERSIONES DE DATOS (ETag / GET condicional de los feeds)
+# -----------------------------------------------------------------------------
+# Una sola versión, la de las tareas (feriados/ausencias se versionan aparte,
+# por año: CALENDARIOS ANUALES). Es MAX(id_cambio) de tarea_cambio: la suben
+# solo los triggers de 'tarea' (también ante ediciones hechas por fuera de la
+# app), no los logins, las escrituras en usuario ni los checkpoints del WAL.
+# Se consulta a lo sumo cada VERSION_TAREA_SEG; las escrituras propias la
+# invalidan al instante (bump_version).
+VERSION_TAREA_SEG = float(os.environ.get("VERSION_TAREA_SEG", "1"))
+_EPOCH = f"{os.getpid():x}{time.time_ns():x}"   # distinto en cada arranque
+_version_tarea = {"valor": None, "vence": 0.0, "gen": 0}
+_versiones_lock = threading.Lock()
+
+def bump_version():
+    with _versiones_lock:
+        _version_tarea["vence"] = 0.0
+        _version_tarea["gen"] += 1
+    # write-through: lo cacheado con la versión anterior ya no se va a pedir
+    feed_cache.clear()
+    stats_cache.clear()
+    if copia_lectura is not None:
+        copia_lectura.marcar(propio=True)
+        mantenimiento_db.despertar()
+
+def version_tarea() -> int:
+    ahora = time.monotonic()
+    with _versiones_lock:
+        if _version_tarea["valor"] is not None and ahora < _version_tarea["vence"]:
+            return _version_tarea["valor"]
+        gen = _version_tarea["gen"]
+    with get_connection() as conn:
+        with closing(conn.cursor()) as cursor:
+            valor = token_cambios(cursor)
+    with _versiones_lock:
+        anterior = _version_tarea["valor"]
+        # Si hubo un bump_version mientras se consultaba, el valor leído puede ser viejo
+        if _version_tarea["gen"] == gen:
+            _version_tarea.update(valor=valor, vence=ahora + VERSION_TAREA_SEG)
+    if anterior is not None and valor != anterior:
+        # Cambio hecho por fuera de la app: lo cacheado ya no se va a pedir
+        feed_cache.clear()
+        stats_cache.clear()
+    return valor
+
+def data_version() -> str:
+    return f"{_EPOCH}.{version_tarea()}"
+
+def version_lectura() -> str:
+    """Versión de lo que va a leer el request: la de su copia, o la de la primaria."""
+    snap = fuente_lectura()
+    return f"{_EPOCH}.{snap.version_tarea}" if snap is not None else data_version()
+
+def feed_etag(*claves) -> str:
+    """ETag fuerte = versión de las tareas + parámetros de la consulta (rango, etc.)."""
+    base = "|".join([version_lectura()] + [str(c) for c in claves])
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+def no_modificado(etag: str):
+    """Si el If-None-Match del cliente coincide, devuelve el 304 listo; si no, None."""
+    inm = request.if_none_match
+    # Comparación débil: la versión comprimida lleva el mismo ETag como W/"..."
+    if not (inm.star_tag or inm.contains_weak(etag)):
+        return None
+    resp = app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+def con_etag(resp, etag: str):
+    resp.set_etag(etag)
+    # no-cache = el navegador guarda la respuesta pero revalida siempre (→ 304)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# -----------------------------------------------------------------------------
+# CACHÉ EN PROCESO (payloads serializados de los feeds)
+# -----------------------------------------------------------------------------
+class LRUCache:
+    """LRU acotado y thread-safe, con contadores de aciertos/fallos y TTL opcional (seg.)."""
+
+    def __init__(self, max_items: int = 32, ttl: float = None):
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self._data = OrderedDict()   # clave → (valor, vence)
+        self._lock = threading.Lock()
+        self._building = {}   # clave → Lock de quien la está construyendo
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        """(True, valor) si está y no venció. Llamar con self._lock tomado."""
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, item[0]
+
+    def get(self, key):
+        with self._lock:
+            ok, value = self._lookup(key)
+            if ok:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        vence = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, vence)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_build(self, key, builder):
+        """
+        Devuelve el valor cacheado o lo construye. Si N hilos piden la misma
+        clave a la vez (cambio de turno), uno solo ejecuta builder() y el resto
+        espera y reusa el resultado.
+        """
+        with self._lock:
+            ok, value = self._lookup(key)
+            if ok:
+                self.hits += 1
+                return value
+            lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                with self._lock:
+                    ok, value = self._lookup(key)
+                    if ok:   # lo construyó otro hilo mientras esperábamos
+                        self.hits += 1
+                        return value
+                    self.misses += 1
+                value = builder()
+                self.put(key, value)
+                return value
+        finally:
+            with self._lock:
+                if self._building.get(key) is lock:
+                    del self._building[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._data),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+feed_cache = LRUCache(int(os.environ.get("FEED_CACHE_SIZE", "32")))
+stats_cache = LRUCache(64)
+
+# -----------------------------------------------------------------------------
+# COMPRESIÓN (gzip / brotli) de respuestas de texto
+# -----------------------------------------------------------------------------
+# Se comprime en after_request lo que supere COMPRESION_MIN bytes. Con ETag, el
+# resultado se cachea por (etag, codificación): un feed repetido o un estático
+# se comprimen una sola vez. Las respuestas transmitidas se comprimen por partes.
+COMPRESION_MIN = int(os.environ.get("COMPRESION_MIN", "1024"))
+COMPRESION_NIVEL = int(os.environ.get("COMPRESION_NIVEL", "6"))       # gzip 1-9
+BROTLI_CALIDAD = int(os.environ.get("BROTLI_CALIDAD", "5"))           # br 0-11
+COMPRIMIBLES = {
+    "application/json", "application/javascript", "text/javascript", "text/css",
+    "text/html", "text/plain", "image/svg+xml",
+}
+comprimidos = LRUCache(int(os.environ.get("COMPRESION_CACHE", "64")))
+
+def _codificacion_aceptada():
+    acepta = request.accept_encodings
+    if brotli is not None and acepta["br"]:
+        return "br"
+    if acepta["gzip"]:
+        return "gzip"
+    return None
+
+def _comprimir(datos: bytes, cod: str) -> bytes:
+    if cod == "br":
+        return brotli.compress(datos, quality=BROTLI_CALIDAD)
+    return gzip.compress(datos, compresslevel=COMPRESION_NIVEL, mtime=0)
+
+def _comprimir_stream(iterable, cod: str):
+    if cod == "br":
+        comp = brotli.Compressor(quality=BROTLI_CALIDAD)
+        procesar, cerrar = comp.process, comp.finish
+    else:
+        comp = zlib.compressobj(COMPRESION_NIVEL, zlib.DEFLATED, 31)   # 31 = formato gzip
+        procesar, cerrar = comp.compress, comp.flush
+    try:
+        for chunk in iterable:
+            salida = procesar(chunk)
+            if salida:
+                yield salida
+        yield cerrar()
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+
+@app.after_request
+def comprimir_respuesta(resp):
+    if (request.method == "HEAD" or resp.status_code != 200
+            or resp.mimetype not in COMPRIMIBLES
+            or "Content-Encoding" in resp.headers or "Range" in request.headers):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    cod = _codificacion_aceptada()
+    if cod is None:
+        return resp
+
+    if resp.is_streamed and not resp.direct_passthrough:
+        resp.response = _comprimir_stream(resp.response, cod)
+    else:
+        if resp.content_length is not None and resp.content_length < COMPRESION_MIN:
+            return resp
+        etag, _ = resp.get_etag()
+        clave = (etag, cod, resp.content_length) if etag and resp.content_length is not None else None
+        cuerpo = comprimidos.get(clave) if clave else None
+        if cuerpo is not None:
+            # Acierto: el cuerpo original (en estáticos, el archivo) ni se lee
+            if resp.direct_passthrough and hasattr(resp.response, "close"):
+                resp.response.close()
+        else:
+            resp.direct_passthrough = False    # estáticos: se lee el archivo para comprimirlo
+            datos = resp.get_data()
+            if len(datos) < COMPRESION_MIN:
+                return resp
+            cuerpo = _comprimir(datos, cod)
+            if clave:
+                comprimidos.put(clave, cuerpo)
+        resp.set_data(cuerpo)
+
+    resp.headers["Content-Encoding"] = cod
+    etag, debil = resp.get_etag()
+    if etag and not debil:
+        resp.set_etag(etag, weak=True)   # mismo contenido, otra codificación
+    return resp
+
+# -----------------------------------------------------------------------------
+# ESTÁTICOS con hash de contenido (?v=) y caché larga
+# -----------------------------------------------------------------------------
+# url_for('static', ...) agrega v=<hash del archivo>. Si el pedido trae el hash
+# vigente, el navegador puede guardarlo un año sin revalidar; al cambiar el
+# archivo cambia la URL. Los módulos JS importados entre sí (sin v) revalidan.
+_hashes_estaticos = {}   # filename → (mtime_ns, size, hash)
+_hashes_lock = threading.Lock()
+
+def hash_estatico(filename: str):
+    ruta = safe_join(app.static_folder, filename)
+    if not ruta:
+        return None
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    with _hashes_lock:
+        item = _hashes_estaticos.get(filename)
+        if item and item[0] == st.st_mtime_ns and item[1] == st.st_size:
+            return item[2]
+    with open(ruta, "rb") as f:
+        h = hashlib.sha1(f.read()).hexdigest()[:12]
+    with _hashes_lock:
+        _hashes_estaticos[filename] = (st.st_mtime_ns, st.st_size, h)
+    return h
+
+@app.url_defaults
+def version_estaticos(endpoint, values):
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        h = hash_estatico(values["filename"])
+        if h:
+            values["v"] = h
+
+@app.after_request
+def cache_estaticos(resp):
+    if request.endpoint == "static" and resp.status_code in (200, 304):
+        v = request.args.get("v")
+        if v and v == hash_estatico((request.view_args or {}).get("filename", "")):
+            resp.cache_control.public = True
+            resp.cache_control.max_age = 31536000
+            resp.cache_control.immutable = True
+            resp.cache_control.no_cache = None
+    return resp
+
+# -----------------------------------------------------------------------------
+# PUSH EN VIVO (Server-Sent Events)
+# -----------------------------------------------------------------------------
+# Cada suscriptor ocupa un hilo de waitress mientras está conectado, por eso hay
+# tope de clientes y de duración: el resto usa el polling de /api/tareas/changes.
+SSE_MAX_CLIENTES = int(os.environ.get("SSE_MAX_CLIENTES", "2"))
+SSE_COLA_MAX = int(os.environ.get("SSE_COLA_MAX", "100"))         # mensajes pendientes por cliente
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", "15"))       # seg. entre pings
+SSE_VIDA_MAX = float(os.environ.get("SSE_VIDA_MAX", "300"))        # seg.; luego el navegador reconecta
+
+class _Suscriptor:
+    def __init__(self, cola_max: int):
+        self.cola = deque(maxlen=cola_max)
+        self.cond = threading.Condition()
+        self.desbordado = False
+
+    def poner(self, mensaje: str):
+        with self.cond:
+            if len(self.cola) == self.cola.maxlen:
+                # Cliente lento: se descarta lo pendiente y se le pide resync
+                self.cola.clear()
+                self.desbordado = True
+            self.cola.append(mensaje)
+            self.cond.notify()
+
+    def esperar(self, timeout: float):
+        """Devuelve (mensajes, desbordado); lista vacía si venció el timeout."""
+        with self.cond:
+            if not self.cola:
+                self.cond.wait(timeout)
+            mensajes = list(self.cola)
+            self.cola.clear()
+            desbordado, self.desbordado = self.desbordado, False
+            return mensajes, desbordado
+
+class Difusor:
+    """Reparte notificaciones compactas a los clientes SSE conectados (en proceso)."""
+
+    def __init__(self, max_clientes: int, cola_max: int):
+        self.max_clientes = max_clientes
+        self.cola_max = cola_max
+        self._subs = set()
+        self._lock = threading.Lock()
+        self.publicados = 0
+        self.rechazados = 0
+
+    def suscribir(self):
+        with self._lock:
+            if len(self._subs) >= self.max_clientes:
+                self.rechazados += 1
+                return None
+            sub = _Suscriptor(self.cola_max)
+            self._subs.add(sub)
+            return sub
+
+    def desuscribir(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publicar(self, evento: str, datos: dict):
+        mensaje = f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+        with self._lock:
+            subs = list(self._subs)
+            self.publicados += 1
+        for sub in subs:
+            sub.poner(mensaje)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clientes": len(self._subs),
+                "max_clientes": self.max_clientes,
+                "publicados": self.publicados,
+                "rechazados": self.rechazados,
+            }
+
+difusor = Difusor(SSE_MAX_CLIENTES, SSE_COLA_MAX)
+
+def tarea_modificada(op: str, id_tarea=None):
+    """
+    Tras un commit sobre 'tarea': invalida versiones/cachés y avisa a los clientes en vivo.
+    En los lotes id_tarea es la lista de ids: un solo aviso para todo el lote.
+    """
+    bump_version()
+    difusor.publicar("tarea", {"op": op, "id": id_tarea})
+
+# -----------------------------------------------------------------------------
+# HASH DE CONTRASEÑAS (pool acotado) y RATE LIMIT de login
+# -----------------------------------------------------------------------------
+# scrypt/pbkdf2 son caros a propósito. Se ejecutan en un pool chico para que una
+# ráfaga de logins (cambio de turno, fuerza bruta) no ocupe todos los hilos de
+# waitress con CPU: el resto de los pedidos (feeds del calendario) sigue andando.
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "2"))
+HASH_COLA_MAX = int(os.environ.get("HASH_COLA_MAX", "8"))            # pedidos esperando turno
+HASH_COLA_TIMEOUT = float(os.environ.get("HASH_COLA_TIMEOUT", "5"))  # seg. máx. en cola
+
+class HashOcupado(Exception):
+    """El pool de hash está lleno o el pedido esperó demasiado en la cola."""
+
+class HashPool:
+    def __init__(self, workers: int, cola_max: int, cola_timeout: float):
+        self.workers = max(1, workers)
+        self.cola_max = max(0, cola_max)
+        self.cola_timeout = cola_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        self._lock = threading.Lock()
+        self._pendientes = 0        # en cola + ejecutando
+        # métricas
+        self.ejecutados = 0
+        self.rechazados = 0
+        self.vencidos = 0
+        self.cola_pico = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._hash_total = 0.0
+        self._hash_max = 0.0
+
+    def _tarea(self, encolado: float, empezada: threading.Event, fn, args):
+        empezada.set()
+        espera = time.monotonic() - encolado
+        if espera > self.cola_timeout:
+            with self._lock:
+                self.vencidos += 1
+            raise HashOcupado()
+        t0 = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            dur = time.monotonic() - t0
+            with self._lock:
+                self.ejecutados += 1
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+                self._hash_total += dur
+                self._hash_max = max(self._hash_max, dur)
+
+    def ejecutar(self, fn, *args):
+        """
+        Corre fn(*args) en el pool y espera el resultado. Lanza HashOcupado si
+        no hay lugar o si pasan HASH_COLA_TIMEOUT seg. sin que un hilo lo tome
+        (el pedido se saca de la cola; el hash en sí no tiene límite).
+        """
+        with self._lock:
+            if self._pendientes >= self.workers + self.cola_max:
+                self.rechazados += 1
+                raise HashOcupado()
+            self._pendientes += 1
+            self.cola_pico = max(self.cola_pico, self._pendientes - self.workers)
+        try:
+            empezada = threading.Event()
+            fut = self._executor.submit(self._tarea, time.monotonic(), empezada, fn, args)
+            # cancel() falla si un hilo lo tomó justo ahora: entonces se espera el resultado
+            if not empezada.wait(self.cola_timeout) and fut.cancel():
+                with self._lock:
+                    self.vencidos += 1
+                raise HashOcupado()
+            return fut.result()
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def check(self, pwhash: str, password: str) -> bool:
+        return self.ejecutar(check_password_hash, pwhash, password)
+
+    def generate(self, password: str) -> str:
+        return self.ejecutar(generate_password_hash, password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self.ejecutados
+            return {
+                "workers": self.workers,
+                "cola_max": self.cola_max,
+                "en_curso": min(self._pendientes, self.workers),
+                "en_cola": max(0, self._pendientes - self.workers),
+                "cola_pico": self.cola_pico,
+                "ejecutados": n,
+                "rechazados": self.rechazados,
+                "vencidos": self.vencidos,
+                "espera_prom_ms": round(self._espera_total / n * 1000, 2) if n else None,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+                "hash_prom_ms": round(self._hash_total / n * 1000, 2) if n else None,
+                "hash_max_ms": round(self._hash_max * 1000, 2),
+            }
+
+hash_pool = HashPool(HASH_WORKERS, HASH_COLA_MAX, HASH_COLA_TIMEOUT)
+
+# Token bucket por clave (IP / usuario): 'rafaga' intentos seguidos y luego
+# 'por_min' por minuto. Se consulta ANTES de tocar la base o el hash.
+# - Usuario: cuenta cada intento (protege la cuenta y el pool de hash).
+# - IP: cuenta solo los intentos fallidos; así una oficina detrás de un NAT
+#   puede loguearse toda junta al inicio del turno.
+# La IP es request.remote_addr. X-Forwarded-For lo arma el cliente: solo se usa
+# detrás de un proxy declarado en PROXY_CONFIABLE (cantidad de proxies), vía ProxyFix.
+PROXY_CONFIABLE = int(os.environ.get("PROXY_CONFIABLE", "0"))
+if PROXY_CONFIABLE > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_CONFIABLE, x_proto=PROXY_CONFIABLE)
+RATE_IP_RAFAGA = int(os.environ.get("RATE_IP_RAFAGA", "20"))
+RATE_IP_POR_MIN = float(os.environ.get("RATE_IP_POR_MIN", "10"))
+RATE_USUARIO_RAFAGA = int(os.environ.get("RATE_USUARIO_RAFAGA", "5"))
+RATE_USUARIO_POR_MIN = float(os.environ.get("RATE_USUARIO_POR_MIN", "3"))
+
+class RateLimiter:
+    def __init__(self, rafaga: int, por_min: float, max_claves: int = 10000):
+        self.rafaga = max(1, rafaga)
+        self.por_seg = max(por_min, 0.001) / 60.0
+        self.max_claves = max_claves
+        self._buckets = OrderedDict()   # clave → (tokens, último refill)
+        self._lock = threading.Lock()
+        self.rechazados = 0
+
+    def consumir(self, clave: str, descontar: bool = True) -> float:
+        """
+        Descuenta un token. Devuelve 0 si pasa, o los segundos a esperar si no.
+        Con descontar=False solo verifica que quede al menos uno.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(clave, (float(self.rafaga), ahora))
+            tokens = min(self.rafaga, tokens + (ahora - ts) * self.por_seg)
+            espera = 0.0
+            if tokens >= 1:
+                if descontar:
+                    tokens -= 1
+            else:
+                espera = (1 - tokens) / self.por_seg
+                self.rechazados += 1
+            self._buckets[clave] = (tokens, ahora)
+            while len(self._buckets) > self.max_claves:
+                self._buckets.popitem(last=False)
+            return espera
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"claves": len(self._buckets), "rechazados": self.rechazados}
+
+rate_ip = RateLimiter(RATE_IP_RAFAGA, RATE_IP_POR_MIN)
+rate_usuario = RateLimiter(RATE_USUARIO_RAFAGA, RATE_USUARIO_POR_MIN)
+
+def limite_intentos(ip: str, usuario: str) -> int:
+    """Segundos que hay que esperar (0 = puede intentar). Consume del bucket del usuario."""
+    espera = max(rate_ip.consumir(ip, descontar=False), rate_usuario.consumir(usuario))
+    return int(espera) + 1 if espera else 0
+
+def intento_fallido(ip: str):
+    """Clave incorrecta o usuario inexistente: descuenta del bucket de la IP."""
+    rate_ip.consumir(ip)
+
 # -----------------------------------------------------------------------------
 # AUTH (tabla: usuario)  — Fechas en LOCAL TIME con formato SQLite
 # -----------------------------------------------------------------------------
@@ -101,29 +1727,71 @@ def record_login_success(conn, id_usuario: int):
          WHERE id_usuario = ?
     """, (_now_local_str(), _now_local_str(), id_usuario))
     conn.commit()
+    usuario_cache.invalidate(id_usuario)
 
 def record_login_failure(conn, id_usuario: int, max_intentos: int = 5, lock_min: int = 10):
+    # Un solo UPDATE: el incremento es atómico aunque lleguen fallos en paralelo
     cur = conn.cursor()
-    cur.execute("SELECT intentos_fallidos FROM usuario WHERE id_usuario = ?", (id_usuario,))
-    row = cur.fetchone()
-    intentos = (row["intentos_fallidos"] if row else 0) + 1
-    bloqueado_hasta = None
-    if intentos >= max_intentos:
-        bloqueado_hasta = _plus_local_minutes_str(lock_min)
-        intentos = 0
     cur.execute("""
         UPDATE usuario
-           SET intentos_fallidos = ?,
-               bloqueado_hasta = ?,
+           SET intentos_fallidos = CASE WHEN COALESCE(intentos_fallidos, 0) + 1 >= ?
+                                        THEN 0 ELSE COALESCE(intentos_fallidos, 0) + 1 END,
+               bloqueado_hasta   = CASE WHEN COALESCE(intentos_fallidos, 0) + 1 >= ?
+                                        THEN ? ELSE NULL END,
                fecha_actualizacion = ?
          WHERE id_usuario = ?
-    """, (intentos, bloqueado_hasta, _now_local_str(), id_usuario))
+    """, (max_intentos, max_intentos, _plus_local_minutes_str(lock_min), _now_local_str(), id_usuario))
     conn.commit()
+    usuario_cache.invalidate(id_usuario)
+
+# Metadatos del usuario (rol, activo, bloqueo) para revalidar la sesión en cada
+# request sin ir a SQLite: TTL corto, y se invalida al registrar login/fallos.
+USUARIO_CACHE_TTL = float(os.environ.get("USUARIO_CACHE_TTL", "30"))
+usuario_cache = LRUCache(256, ttl=USUARIO_CACHE_TTL)
+
+def usuario_meta(id_usuario: int):
+    """{'id','username','role','activo','bloqueado'} del usuario, o None si no existe."""
+    def cargar():
+        with get_connection() as conn:
+            with closing(conn.cursor()) as cur:
+                cur.execute("""
+                    SELECT id_usuario, nombre_usuario, rol, activo, bloqueado_hasta
+                      FROM usuario
+                     WHERE id_usuario = ?
+                """, (id_usuario,))
+                row = cur.fetchone()
+        if not row:
+            return None
+        return {
+            "id": row["id_usuario"],
+            "username": row["nombre_usuario"],
+            "role": row["rol"],
+            "activo": bool(row["activo"]),
+            "bloqueado": is_locked(row),
+        }
+    return usuario_cache.get_or_build(id_usuario, cargar)
+
+def sesion_vigente():
+    """
+    Usuario de la sesión revalidado contra usuario_meta(); None si ya no puede
+    entrar (borrado o deshabilitado). Un bloqueo por intentos fallidos no corta
+    sesiones abiertas: solo impide nuevos logins.
+    """
+    u = session.get("user")
+    if not u:
+        return None
+    meta = usuario_meta(u.get("id"))
+    if not meta or not meta["activo"]:
+        session.clear()
+        return None
+    if u.get("role") != meta["role"]:
+        session["user"] = {**u, "role": meta["role"]}
+    return session["user"]
 
 def login_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        if "user" not in session:
+        if not sesion_vigente():
             return redirect(url_for("login", next=request.path))
         return f(*args, **kwargs)
     return wrapper
@@ -132,7 +1800,7 @@ def role_required(*roles):
     def deco(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            u = session.get("user")
+            u = sesion_vigente()
             if not u or u.get("role") not in roles:
                 abort(403)
             return f(*args, **kwargs)
@@ -153,19 +1821,34 @@ def login_post():
     username = (request.form.get("username") or "").strip()
     password = request.form.get("password") or ""
     remember = request.form.get("remember") == "1"
+    ip = request.remote_addr
+
+    espera = limite_intentos(ip, _norm_user(username))
+    if espera:
+        app.logger.warning("Login limitado para usuario=%r | IP: %s", username, ip)
+        return (render_template("login.html", error="Demasiados intentos. Espere unos minutos."),
+                429, {"Retry-After": str(espera)})
 
     with get_connection() as conn:
         row = get_usuario_por_nombre(conn, username)
 
     if not row:
+        intento_fallido(ip)
         return render_template("login.html", error="Usuario o contraseña inválidos."), 401
     if not row["activo"]:
         return render_template("login.html", error="Cuenta deshabilitada."), 403
     if is_locked(row):
         return render_template("login.html", error="Cuenta bloqueada temporalmente. Intente más tarde."), 423
 
-    # Valida hash generado con scrypt/pbkdf2 por Werkzeug
-    if not check_password_hash(row["clave_hash"], password):
+    # Valida hash generado con scrypt/pbkdf2 por Werkzeug (en el pool de hash)
+    try:
+        clave_ok = hash_pool.check(row["clave_hash"], password)
+    except HashOcupado:
+        app.logger.warning("Pool de hash ocupado en login | IP: %s", ip)
+        return (render_template("login.html", error="Servidor ocupado. Intente nuevamente en unos segundos."),
+                503, {"Retry-After": "5"})
+    if not clave_ok:
+        intento_fallido(ip)
         with get_connection() as conn:
             record_login_failure(conn, row["id_usuario"])
         return render_template("login.html", error="Usuario o contraseña inválidos."), 401
@@ -206,23 +1889,33 @@ def api_cambiar_clave():
         return jsonify({"success": False, "message": "La nueva contraseña debe tener al menos 8 caracteres, letras y números."}), 400
 
     uid = session["user"]["id"]
+    ip = request.remote_addr
+
+    espera = limite_intentos(ip, f"id:{uid}")
+    if espera:
+        return (jsonify({"success": False, "message": "Demasiados intentos. Espere unos minutos."}),
+                429, {"Retry-After": str(espera)})
 
     try:
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute("SELECT clave_hash FROM usuario WHERE id_usuario = ?", (uid,))
             row = cur.fetchone()
-            if not row:
-                return jsonify({"success": False, "message": "Usuario no encontrado."}), 404
+        if not row:
+            return jsonify({"success": False, "message": "Usuario no encontrado."}), 404
 
-            if not check_password_hash(row["clave_hash"], actual):
-                return jsonify({"success": False, "message": "La contraseña actual no es correcta."}), 400
+        # Hash fuera de la conexión: no retiene una conexión del pool durante scrypt
+        if not hash_pool.check(row["clave_hash"], actual):
+            intento_fallido(ip)
+            return jsonify({"success": False, "message": "La contraseña actual no es correcta."}), 400
 
-            # Evitar que sea igual a la anterior
-            if check_password_hash(row["clave_hash"], nueva):
-                return jsonify({"success": False, "message": "La nueva contraseña no puede ser igual a la actual."}), 400
+        # Evitar que sea igual a la anterior
+        if hash_pool.check(row["clave_hash"], nueva):
+            return jsonify({"success": False, "message": "La nueva contraseña no puede ser igual a la actual."}), 400
 
-            nuevo_hash = generate_password_hash(nueva)
+        nuevo_hash = hash_pool.generate(nueva)
+        with get_connection() as conn:
+            cur = conn.cursor()
             cur.execute("""
                 UPDATE usuario
                    SET clave_hash = ?, fecha_actualizacion = ?
@@ -230,9 +1923,13 @@ def api_cambiar_clave():
             """, (nuevo_hash, _now_local_str(), uid))
             conn.commit()
 
-        app.logger.info(f"Usuario {uid} actualizó su contraseña")
+        app.logger.info("Usuario %s actualizó su contraseña", uid)
         return jsonify({"success": True, "message": "Contraseña actualizada correctamente."})
 
+    except HashOcupado:
+        app.logger.warning("Pool de hash ocupado en /api/cambiar_clave | IP: %s", ip)
+        return (jsonify({"success": False, "message": "Servidor ocupado. Intente nuevamente en unos segundos."}),
+                503, {"Retry-After": "5"})
     except Exception as e:
         app.logger.exception("Error en /api/cambiar_clave")
         return jsonify({"success": False, "message": "Error interno."}), 500
@@ -248,56 +1945,536 @@ def index():
                            username=u.get("username", ""),
                            role=u.get("role", ""))
 
+# -----------------------------------------------------------------------------
+# API: DIAGNÓSTICO (estado de cachés internas)
+# -----------------------------------------------------------------------------
+@app.get("/api/diagnostico")
+@login_required
+def api_diagnostico():
+    return jsonify({
+        "feed_cache": feed_cache.stats(),
+        "stats_cache": stats_cache.stats(),
+        "db_pool": db_pool.stats(),
+        "sse": difusor.stats(),
+        "hash": hash_pool.stats(),
+        "usuario_cache": usuario_cache.stats(),
+        "logs": log_stats(),
+        "rate_limit": {"ip": rate_ip.stats(), "usuario": rate_usuario.stats()},
+        "copia_lectura": copia_lectura.stats() if copia_lectura is not None else {"modo": None},
+        "wal": checkpoint_wal.stats(),
+        "poda_cambios": poda_cambios.stats(),
+        "calendarios": calendarios.stats(),
+        "arranque": arranque_estado,
+    })
+
+# -----------------------------------------------------------------------------
+# MÉTRICAS: /metrics (texto Prometheus)
+# -----------------------------------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    con_token = bool(METRICS_TOKEN) and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+    if not con_token and not (METRICS_LOCALHOST and request.remote_addr in ("127.0.0.1", "::1")):
+        abort(403)
+
+    pool = db_pool.stats()
+    hashes = hash_pool.stats()
+    wal = checkpoint_wal.stats()
+    extra = [
+        "# TYPE calendario_db_pool_conexiones gauge",
+        f'calendario_db_pool_conexiones{{estado="abiertas"}} {pool["abiertas"]}',
+        f'calendario_db_pool_conexiones{{estado="libres"}} {pool["libres"]}',
+        "# TYPE calendario_db_pool_timeouts_total counter",
+        f'calendario_db_pool_timeouts_total {pool["timeouts"]}',
+        "# TYPE calendario_sse_clientes gauge",
+        f'calendario_sse_clientes {difusor.stats()["clientes"]}',
+        "# TYPE calendario_hash_en_cola gauge",
+        f'calendario_hash_en_cola {hashes["en_cola"]}',
+        "# TYPE calendario_hash_rechazados_total counter",
+        f'calendario_hash_rechazados_total {hashes["rechazados"] + hashes["vencidos"]}',
+        "# TYPE calendario_log_descartados_total counter",
+        f'calendario_log_descartados_total {log_stats().get("descartados", 0)}',
+        "# TYPE calendario_wal_bytes gauge",
+        f'calendario_wal_bytes {wal["wal_bytes"]}',
+        "# TYPE calendario_wal_checkpoints_total counter",
+        f'calendario_wal_checkpoints_total{{resultado="completo"}} {wal["checkpoints"] - wal["ocupados"]}',
+        f'calendario_wal_checkpoints_total{{resultado="ocupado"}} {wal["ocupados"]}',
+        "# TYPE calendario_wal_alarmas_total counter",
+        f'calendario_wal_alarmas_total {wal["alarmas"]}',
+        "# TYPE calendario_cache_hits_total counter",
+    ]
+    caches = {"feed": feed_cache, "stats": stats_cache, "usuario": usuario_cache}
+    for nombre, cache in caches.items():
+        extra.append(f'calendario_cache_hits_total{{cache="{nombre}"}} {cache.hits}')
+    extra.append("# TYPE calendario_cache_misses_total counter")
+    for nombre, cache in caches.items():
+        extra.append(f'calendario_cache_misses_total{{cache="{nombre}"}} {cache.misses}')
+
+    if copia_lectura is not None:
+        copia = copia_lectura.stats()
+        extra += [
+            "# TYPE calendario_copia_lectura_generacion gauge",
+            f'calendario_copia_lectura_generacion {copia["generacion"] or 0}',
+            "# TYPE calendario_copia_lectura_atraso_segundos gauge",
+            f'calendario_copia_lectura_atraso_segundos {copia["atraso_seg"]}',
+            "# TYPE calendario_copia_lectura_lecturas_total counter",
+            f'calendario_copia_lectura_lecturas_total{{fuente="copia"}} {copia["lecturas"]}',
+            f'calendario_copia_lectura_lecturas_total{{fuente="primaria"}} {copia["a_primaria"]}',
+        ]
+
+    return Response(metricas.render() + "\n".join(extra) + "\n",
+                    mimetype="text/plain; version=0.0.4")
+
 # -----------------------------------------------------------------------------
 # API: TAREAS
 # -----------------------------------------------------------------------------
+# Proyección liviana para la grilla, filtros y contadores. El resto de la fila
+# (comentario, protecciones, etc.) se pide al abrir el modal: /api/tareas/<id>.
+PROPS_LISTA = ("ut", "tipo", "ajuste", "estado", "marca", "modelo", "horario", "lado", "cuenta")
+COLUMNAS_TAREA = "id_tarea, fecha, tarea, " + ", ".join(PROPS_LISTA)
+
+def clase_tarea(tarea) -> str:
+    tipo_tarea = (tarea or "").upper()
+    if "ENSAYO" in tipo_tarea:
+        return "evento-ensayo"
+    elif "AJUSTE" in tipo_tarea:
+        return "evento-ajuste"
+    elif "EVENTOS" in tipo_tarea:
+        return "evento-evento"
+    elif "FUNCIÓN" in tipo_tarea or "FUNCION" in tipo_tarea:
+        return "evento-funcionalidad"
+    elif "ACTUALIZAR" in tipo_tarea:
+        return "evento-actualizar"
+    return "evento-default"
+
+def evento_tarea(row, completo: bool = False) -> dict:
+    """Fila de 'tarea' → evento de FullCalendar (completo=True: todas las columnas)."""
+    return {
+        "id": row["id_tarea"],
+        "title": row["tarea"],
+        "start": str(row["fecha"]).split(" ")[0] if row["fecha"] else None,
+        "allDay": True,
+        "order": "000",
+        "classNames": [clase_tarea(row["tarea"])],
+        "extendedProps": dict(row) if completo else {k: row[k] for k in PROPS_LISTA}
+    }
+
+def token_cambios(cursor) -> int:
+    cursor.execute("SELECT COALESCE(MAX(id_cambio), 0) FROM tarea_cambio")
+    return cursor.fetchone()[0]
+
+# Filas por fetchmany al serializar: acota la memoria por request
+TAREAS_LOTE = int(os.environ.get("TAREAS_LOTE", "500"))
+# Historial completo: hasta acá se arma en memoria; lo que exceda va a un temporal en disco
+TAREAS_SPOOL_MB = int(os.environ.get("TAREAS_SPOOL_MB", "8"))
+
+def _json_tareas(cursor, stats: dict):
+    """Recorre el cursor de a lotes y emite el array JSON de eventos en trozos (bytes)."""
+    yield b"["
+    n = 0
+    while True:
+        rows = cursor.fetchmany(TAREAS_LOTE)
+        if not rows:
+            break
+        trozo = ",".join(app.json.dumps(evento_tarea(r), separators=(",", ":")) for r in rows)
+        yield (("," if n else "") + trozo).encode("utf-8")
+        n += len(rows)
+    yield b"]\n"
+    stats["cantidad"] = n
+
+def _select_tareas(cursor, desde, hasta):
+    where, params = where_rango(desde, hasta)
+    cursor.execute(f"""
+        SELECT {COLUMNAS_TAREA}
+          FROM tarea{where}
+    """, params)
+
+def _payload_tareas(desde, hasta):
+    """Consulta + serialización. Devuelve (bytes JSON, cantidad de eventos, token de sync)."""
+    stats = {}
+    with get_read_connection() as conn:
+        with closing(conn.cursor()) as cursor:
+            # El token se lee antes: lo que cambie en el medio vuelve a llegar
+            # como delta (el merge del cliente es idempotente).
+            token = token_cambios(cursor)
+            _select_tareas(cursor, desde, hasta)
+            payload = b"".join(_json_tareas(cursor, stats))
+    return payload, stats["cantidad"], token
+
+def _spool_tareas(desde, hasta):
+    """
+    Serializa a un archivo temporal (en memoria hasta TAREAS_SPOOL_MB, después
+    en disco) y devuelve (archivo, cantidad, token). La conexión y la lectura
+    se liberan antes de enviar: un cliente lento no retiene el pool ni el WAL.
+    """
+    stats = {}
+    spool = tempfile.SpooledTemporaryFile(max_size=TAREAS_SPOOL_MB * 1048576)
+    try:
+        with get_read_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                token = token_cambios(cursor)
+                _select_tareas(cursor, desde, hasta)
+                for trozo in _json_tareas(cursor, stats):
+                    spool.write(trozo)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, stats["cantidad"], token
+
+def _enviar_spool(spool):
+    """Generador para Response: lee el temporal de a trozos y lo cierra al terminar."""
+    try:
+        while True:
+            trozo = spool.read(65536)
+            if not trozo:
+                break
+            yield trozo
+    finally:
+        spool.close()
+
 @app.route("/api/tareas")
 def tareas():
+    try:
+        desde, hasta = rango_fechas()
+    except ValueError:
+        return jsonify([]), 400
+
+    etag = feed_etag(desde, hasta)
+    resp_304 = no_modificado(etag)
+    if resp_304 is not None:
+        return resp_304
+
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    try:
+        # Historial completo (o ?stream=1): se arma en un temporal acotado y
+        # se transmite de a trozos, sin ocupar la caché. La conexión vuelve al
+        # pool antes del primer byte.
+        if (desde is None and hasta is None) or request.args.get("stream") == "1":
+            spool, cantidad, token = _spool_tareas(desde, hasta)
+            app.logger.info("/api/tareas (stream): %s tareas devueltas [%s → %s] | IP: %s",
+                            cantidad, desde or "…", hasta or "…", ip)
+            resp = Response(_enviar_spool(spool), mimetype="application/json")
+            resp.headers["X-Sync-Token"] = str(token)
+            return con_etag(resp, etag)
+
+        # Clave = versión de las tareas + rango: otras escrituras (logins,
+        # usuarios, checkpoints) no la cambian y la entrada se sigue usando
+        payload, cantidad, token = feed_cache.get_or_build(
+            (version_lectura(), desde, hasta), lambda: _payload_tareas(desde, hasta))
+
+        app.logger.info("/api/tareas: %s tareas devueltas [%s → %s] | IP: %s",
+                        cantidad, desde or "…", hasta or "…", ip)
+        resp = app.response_class(payload, mimetype="application/json")
+        resp.headers["X-Sync-Token"] = str(token)   # punto de partida para /api/tareas/changes
+        return con_etag(resp, etag)
+    except Exception:
+        app.logger.exception("Error en /api/tareas")
+        return jsonify([]), 500
+
+@app.get("/api/tareas/<int:id_tarea>")
+def tarea_detalle(id_tarea):
+    """Fila completa de una tarea (para el modal de detalle/edición). Siempre de la primaria."""
+    try:
+        with get_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                cursor.execute("SELECT * FROM tarea WHERE id_tarea = ?", (id_tarea,))
+                row = cursor.fetchone()
+        if not row:
+            return jsonify({"success": False, "message": "Tarea no encontrada."}), 404
+        return jsonify({"success": True, "item": evento_tarea(row, completo=True)})
+    except Exception:
+        app.logger.exception("Error en /api/tareas/%s", id_tarea)
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+# -----------------------------------------------------------------------------
+# API: TAREAS — BÚSQUEDA DE TEXTO
+# -----------------------------------------------------------------------------
+# Cada palabra se busca como prefijo ("ut-12" → "ut"* "12"*) y todas deben
+# aparecer. Orden por relevancia (bm25, UT y ajuste pesan más) y luego fecha.
+BUSQUEDA_MAX_POR_PAGINA = 200
+FTS_PESOS = "4.0, 4.0, 1.0, 1.0, 1.5, 1.5, 1.0, 2.0"   # en el orden de FTS_COLUMNAS
+
+def _terminos_busqueda(q: str):
+    return re.findall(r"\w+", q or "")[:10]
+
+@app.get("/api/tareas/search")
+def tareas_search():
+    terminos = _terminos_busqueda(request.args.get("q"))
+    if not terminos:
+        return jsonify({"success": False, "message": "Falta 'q'"}), 400
+    try:
+        page = max(1, int(request.args.get("page", "1")))
+        per_page = min(BUSQUEDA_MAX_POR_PAGINA, max(1, int(request.args.get("per_page", "50"))))
+    except ValueError:
+        return jsonify({"success": False, "message": "page/per_page inválidos"}), 400
+
+    etag = feed_etag("search", " ".join(terminos), page, per_page)
+    resp = no_modificado(etag)
+    if resp is not None:
+        return resp
+
+    columnas = ", ".join(f"t.{c}" for c in COLUMNAS_TAREA.split(", "))
+    try:
+        with get_read_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                if FTS_TAREAS:
+                    match = " ".join('"' + t.replace('"', '""') + '"*' for t in terminos)
+                    cursor.execute("SELECT COUNT(*) FROM tarea_fts WHERE tarea_fts MATCH ?", (match,))
+                    total = cursor.fetchone()[0]
+                    cursor.execute(f"""
+                        SELECT {columnas}, bm25(tarea_fts, {FTS_PESOS}) AS rank
+                          FROM tarea_fts
+                          JOIN tarea t ON t.id_tarea = tarea_fts.rowid
+                         WHERE tarea_fts MATCH ?
+                         ORDER BY rank, t.fecha DESC
+                         LIMIT ? OFFSET ?
+                    """, (match, per_page, (page - 1) * per_page))
+                else:
+                    # Sin FTS5: cada término en alguna columna (escaneo completo)
+                    cond = "(" + " OR ".join(f"t.{c} LIKE ?" for c in FTS_COLUMNAS) + ")"
+                    where = " AND ".join([cond] * len(terminos))
+                    params = [f"%{t}%" for t in terminos for _ in FTS_COLUMNAS]
+                    cursor.execute(f"SELECT COUNT(*) FROM tarea t WHERE {where}", params)
+                    total = cursor.fetchone()[0]
+                    cursor.execute(f"""
+                        SELECT {columnas}, NULL AS rank
+                          FROM tarea t
+                         WHERE {where}
+                         ORDER BY t.fecha DESC
+                         LIMIT ? OFFSET ?
+                    """, params + [per_page, (page - 1) * per_page])
+                rows = cursor.fetchall()
+
+        items = [{**evento_tarea(r), "rank": r["rank"]} for r in rows]
+        return con_etag(jsonify({
+            "success": True,
+            "q": " ".join(terminos),
+            "fts": FTS_TAREAS,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "items": items,
+        }), etag)
+    except Exception:
+        app.logger.exception("Error en /api/tareas/search")
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+# -----------------------------------------------------------------------------
+# API: TAREAS — SINCRONIZACIÓN INCREMENTAL
+# -----------------------------------------------------------------------------
+# Tope de tareas distintas por delta; si hay más conviene recargar el feed.
+CAMBIOS_MAX_DELTA = 500
+
+@app.get("/api/tareas/changes")
+def tareas_changes():
+    """
+    ?since=<token> → tareas creadas/modificadas/borradas desde ese token:
+      { "token": "...", "reset": false, "upserts": [eventos], "deleted": [ids] }
+    reset=true → el token es inválido o demasiado viejo: recargar /api/tareas.
+    """
+    try:
+        since = int(request.args.get("since", ""))
+    except ValueError:
+        since = None
+
     try:
         with get_connection() as conn:
             with closing(conn.cursor()) as cursor:
                 cursor.execute("""
-                    SELECT id_tarea, fecha, horario, ut, tarea, tipo, lugar, pedido, marca, modelo,
-                           ajuste, responsable, estado, comentario,
-                           tx_zona, rx_zona, tx_protection, rx_protection,
-                           lado, cuenta, locked_by
-                    FROM tarea
+                    SELECT COALESCE(MIN(id_cambio), 1), COALESCE(MAX(id_cambio), 0)
+                      FROM tarea_cambio
                 """)
-                rows = cursor.fetchall()
+                minimo, actual = cursor.fetchone()
 
-        eventos = []
-        for row in rows:
-            fecha_str = str(row["fecha"]).split(" ")[0] if row["fecha"] else None
-            tipo_tarea = (row["tarea"] or "").upper()
-            if "ENSAYO" in tipo_tarea:
-                clase = "evento-ensayo"
-            elif "AJUSTE" in tipo_tarea:
-                clase = "evento-ajuste"
-            elif "EVENTOS" in tipo_tarea:
-                clase = "evento-evento"
-            elif "FUNCIÓN" in tipo_tarea or "FUNCION" in tipo_tarea:
-                clase = "evento-funcionalidad"
-            elif "ACTUALIZAR" in tipo_tarea:
-                clase = "evento-actualizar"
-            else:
-                clase = "evento-default"
-
-            eventos.append({
-                "id": row["id_tarea"],
-                "title": row["tarea"],
-                "start": fecha_str,
-                "allDay": True,
-                "order": "000",
-                "classNames": [clase],
-                "extendedProps": dict(row)
-            })
+                # Token ausente, del futuro (DB reemplazada) o ya purgado
+                if since is None or since > actual or since < minimo - 1:
+                    return jsonify({"token": str(actual), "reset": True, "upserts": [], "deleted": []})
 
-        ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        app.logger.info(f"/api/tareas: {len(eventos)} tareas devueltas | IP: {ip}")
-        return jsonify(eventos)
+                cursor.execute("""
+                    SELECT DISTINCT id_tarea
+                      FROM tarea_cambio
+                     WHERE id_cambio > ? AND id_cambio <= ?
+                     LIMIT ?
+                """, (since, actual, CAMBIOS_MAX_DELTA + 1))
+                ids = [r[0] for r in cursor.fetchall()]
+                if len(ids) > CAMBIOS_MAX_DELTA:
+                    return jsonify({"token": str(actual), "reset": True, "upserts": [], "deleted": []})
+
+                rows = []
+                if ids:
+                    marcas = ", ".join(["?"] * len(ids))
+                    cursor.execute(f"""
+                        SELECT {COLUMNAS_TAREA}
+                          FROM tarea
+                         WHERE id_tarea IN ({marcas})
+                    """, ids)
+                    rows = cursor.fetchall()
+
+        upserts = [evento_tarea(row) for row in rows]
+        vigentes = {row["id_tarea"] for row in rows}
+        deleted = [i for i in ids if i not in vigentes]
+        return jsonify({"token": str(actual), "reset": False, "upserts": upserts, "deleted": deleted})
     except Exception:
-        app.logger.exception("Error en /api/tareas")
-        return jsonify([]), 500
+        app.logger.exception("Error en /api/tareas/changes")
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+# -----------------------------------------------------------------------------
+# API: TAREAS — PUSH EN VIVO (SSE)
+# -----------------------------------------------------------------------------
+@app.get("/api/stream")
+def api_stream():
+    """
+    text/event-stream con avisos 'tarea' ({op, id}) de cada escritura; el
+    cliente pide el detalle a /api/tareas/changes. 'resync' = se perdieron
+    avisos (cola llena): conviene sincronizar igual.
+    """
+    sub = difusor.suscribir()
+    if sub is None:
+        resp = jsonify({"success": False, "message": "Demasiados clientes en vivo; usar polling."})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "60"
+        return resp
+
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+
+    def eventos():
+        fin = time.monotonic() + SSE_VIDA_MAX
+        try:
+            yield "retry: 5000\n\n"
+            yield "event: hola\ndata: {}\n\n"
+            while time.monotonic() < fin:
+                mensajes, desbordado = sub.esperar(SSE_HEARTBEAT)
+                if desbordado:
+                    yield "event: resync\ndata: {}\n\n"
+                if not mensajes:
+                    yield ": ping\n\n"   # mantiene viva la conexión y detecta desconexiones
+                    continue
+                yield "".join(mensajes)
+        finally:
+            difusor.desuscribir(sub)
+            app.logger.info("/api/stream: cliente desconectado | IP: %s", ip)
+
+    app.logger.info("/api/stream: cliente conectado (%s/%s) | IP: %s",
+                    difusor.stats()["clientes"], difusor.max_clientes, ip)
+    resp = Response(eventos(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"   # por si hay un nginx adelante
+    return resp
+
+# -----------------------------------------------------------------------------
+# API: ESTADÍSTICAS (contador de ensayos y listado anual)
+# -----------------------------------------------------------------------------
+# Misma clasificación que clase_tarea(), en SQL (LIKE ignora mayúsculas ASCII)
+TIPO_TAREA_SQL = """
+    CASE
+      WHEN tarea LIKE '%ENSAYO%'     THEN 'ENSAYO'
+      WHEN tarea LIKE '%AJUSTE%'     THEN 'AJUSTE'
+      WHEN tarea LIKE '%EVENTOS%'    THEN 'EVENTOS'
+      WHEN tarea LIKE '%FUNCI%N%'    THEN 'FUNCION'
+      WHEN tarea LIKE '%ACTUALIZAR%' THEN 'ACTUALIZAR'
+      ELSE 'OTRO'
+    END"""
+
+def _param_anio():
+    """?anio=YYYY → (anio, 'YYYY-01-01', 'YYYY+1-01-01'); (None, None, None) si no vino."""
+    valor = request.args.get("anio")
+    if not valor:
+        return None, None, None
+    anio = int(valor)
+    if not 1900 <= anio <= 2999:
+        raise ValueError(valor)
+    return anio, f"{anio:04d}-01-01", f"{anio + 1:04d}-01-01"
+
+def _stats_items(desde, hasta):
+    where, params = where_rango(desde, hasta)
+    with get_read_connection() as conn:
+        with closing(conn.cursor()) as cursor:
+            cursor.execute(f"""
+                SELECT CAST(substr(fecha, 1, 4) AS INTEGER) AS anio,
+                       {TIPO_TAREA_SQL} AS tipo,
+                       UPPER(TRIM(COALESCE(estado, ''))) AS estado,
+                       COUNT(*) AS cantidad
+                  FROM tarea{where}
+                 GROUP BY 1, 2, 3
+                 ORDER BY 1, 2, 3
+            """, params)
+            return [dict(r) for r in cursor.fetchall()]
+
+@app.get("/api/stats")
+def api_stats():
+    """
+    Conteos por año, tipo de tarea y estado:
+      { "success": true, "items": [{anio, tipo, estado, cantidad}, ...] }
+    ?anio=YYYY limita a ese año (lo que usa el contador del encabezado).
+    """
+    try:
+        anio, desde, hasta = _param_anio()
+    except ValueError:
+        return jsonify({"success": False, "message": "Parámetro 'anio' inválido"}), 400
+
+    etag = feed_etag("stats", anio)
+    resp_304 = no_modificado(etag)
+    if resp_304 is not None:
+        return resp_304
+
+    try:
+        items = stats_cache.get_or_build(("stats", etag), lambda: _stats_items(desde, hasta))
+        return con_etag(jsonify({"success": True, "anio": anio, "items": items}), etag)
+    except Exception:
+        app.logger.exception("Error en /api/stats")
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+@app.get("/api/stats/ensayos")
+def api_stats_ensayos():
+    """
+    Listado paginado de ENSAYOS de un año:
+      ?anio=YYYY&estado=EJECUTADO|PROGRAMADO|SUSPENDIDO|...|TODOS&page=1&per_page=200
+    """
+    try:
+        anio, desde, hasta = _param_anio()
+        page = max(1, int(request.args.get("page", "1")))
+        per_page = min(1000, max(1, int(request.args.get("per_page", "200"))))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parámetros inválidos"}), 400
+    if anio is None:
+        return jsonify({"success": False, "message": "Falta 'anio'"}), 400
+    estado = (request.args.get("estado") or "TODOS").strip().upper()
+
+    etag = feed_etag("ensayos", anio, estado, page, per_page)
+    resp_304 = no_modificado(etag)
+    if resp_304 is not None:
+        return resp_304
+
+    where = "WHERE fecha >= ? AND fecha < ? AND tarea LIKE '%ENSAYO%'"
+    params = [desde, hasta]
+    if estado != "TODOS":
+        where += " AND UPPER(TRIM(COALESCE(estado, ''))) = ?"
+        params.append(estado)
+
+    def construir():
+        with get_read_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM tarea {where}", params)
+                total = cursor.fetchone()[0]
+                cursor.execute(f"""
+                    SELECT id_tarea AS id, substr(fecha, 1, 10) AS fecha, tarea, estado,
+                           ut, lado, cuenta, ajuste, marca, modelo
+                      FROM tarea {where}
+                     ORDER BY fecha, id_tarea
+                     LIMIT ? OFFSET ?
+                """, params + [per_page, (page - 1) * per_page])
+                return total, [dict(r) for r in cursor.fetchall()]
+
+    try:
+        total, items = stats_cache.get_or_build(("ensayos", etag), construir)
+        return con_etag(jsonify({
+            "success": True, "anio": anio, "estado": estado,
+            "page": page, "per_page": per_page, "total": total, "items": items,
+        }), etag)
+    except Exception:
+        app.logger.exception("Error en /api/stats/ensayos")
+        return jsonify({"success": False, "message": "Error interno"}), 500
 
 # -----------------------------------------------------------------------------
 # API: UBICACIÓN LOOKUP
@@ -322,7 +2499,7 @@ def ubicacion_lookup():
     table = table_map.get(tipo)
 
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cur = conn.cursor()
 
             def sql_for(table_name):
@@ -333,7 +2510,7 @@ def ubicacion_lookup():
                       "Población"       AS poblacion,
                       "Distrito"        AS distrito
                     FROM "{table_name}"
-                    WHERE UPPER(REPLACE(REPLACE(CAST("Ubicac.técnica" AS TEXT),'-',''),' ','')) IN (?, ?)
+                    WHERE {UT_NORM_SQL} IN (?, ?)
                     LIMIT 1
                 """
 
@@ -360,28 +2537,203 @@ def ubicacion_lookup():
         app.logger.exception("Error en /api/ubicacion_lookup")
         return jsonify({"success": False, "message": "DB error", "detail": str(e)}), 500
 
+# -----------------------------------------------------------------------------
+# CALENDARIOS ANUALES (feriados / ausencias materializados en memoria)
+# -----------------------------------------------------------------------------
+# Cambian pocas veces al año: se cargan una vez, agrupados por año y ya
+# serializados. Cada año lleva una versión (hash del contenido) que va en la URL
+# (/api/feriados/2025.json?v=...), así navegador y proxies la cachean como
+# inmutable. Los triggers de tabla_version cuentan los cambios de cada tabla
+# (también los hechos por fuera de la app); si la base cambió (mtime/tamaño) se
+# consulta ese contador, a lo sumo una vez cada CALENDARIOS_RECARGA_SEG, y solo
+# se recarga si hubo cambios: cambian las versiones de los años tocados.
+CALENDARIOS_RECARGA_SEG = float(os.environ.get("CALENDARIOS_RECARGA_SEG", "5"))
+
+CALENDARIOS = {
+    "feriados": ("feriado", "SELECT fecha, title FROM feriado", lambda fecha, row: {
+        "title": row["title"],
+        "start": fecha,
+        "display": "background",
+        "order": "002",
+        "classNames": ["fc-holiday"],
+    }),
+    "ausencias": ("ausencia", "SELECT fecha, usuario FROM ausencia", lambda fecha, row: {
+        "title": f"Ausente: {row['usuario']}",
+        "start": fecha,
+        "allDay": True,
+        "order": "001",
+        "classNames": ["evento-ausente"],
+    }),
+}
+
+def _db_stamp() -> str:
+    """mtime/tamaño de la base y su WAL: aviso barato de que algo cambió (sin consultar)."""
+    partes = []
+    for ruta in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            st = os.stat(ruta)
+            partes.append(f"{st.st_mtime_ns:x}.{st.st_size:x}")
+        except OSError:
+            partes.append("-")
+    return "/".join(partes)
+
+class CalendariosAnuales:
+    """Feriados/ausencias por tipo y año: eventos, JSON serializado y versión."""
+
+    def __init__(self, fuentes: dict, recarga_seg: float):
+        self._fuentes = fuentes
+        self._recarga = recarga_seg
+        self._lock = threading.Lock()
+        self._datos = {}          # tipo → {anio: {"eventos", "json", "version"}}
+        self._stamp = None        # fuente verificada por última vez (generación de la copia o _db_stamp())
+        self._firma = None        # contadores de tabla_version de la última carga
+        self._proximo = 0.0
+        self.cargas = 0
+        self.carga_ms = 0.0
+
+    @staticmethod
+    def _anio(eventos: list) -> dict:
+        data = app.json.dumps(eventos, separators=(",", ":")).encode("utf-8")
+        return {"eventos": eventos, "json": data, "version": hashlib.sha1(data).hexdigest()[:16]}
+
+    def _leer_firma(self, cursor):
+        try:
+            cursor.execute("SELECT tabla, version FROM tabla_version ORDER BY tabla")
+            return tuple(tuple(r) for r in cursor.fetchall())
+        except sqlite3.Error:
+            return None   # sin tabla_version: se recarga ante cualquier cambio de la base
+
+    def _cargar(self, cursor) -> dict:
+        datos = {}
+        for tipo, (_, sql, evento) in self._fuentes.items():
+            por_anio = {}
+            cursor.execute(sql + " ORDER BY fecha")
+            for row in cursor.fetchall():
+                fecha = str(row["fecha"] or "")[:10]    # 'YYYY-MM-DD[ HH:MM:SS]' → 'YYYY-MM-DD'
+                if not fecha[:4].isdigit():
+                    continue
+                por_anio.setdefault(int(fecha[:4]), []).append(evento(fecha, row))
+            datos[tipo] = {anio: self._anio(evs) for anio, evs in por_anio.items()}
+        return datos
+
+    def vigentes(self) -> dict:
+        """Datos actuales; si la base cambió, verifica (y recarga) antes de devolver."""
+        if self._stamp is not None and time.monotonic() < self._proximo:
+            return self._datos
+        # Si otro hilo ya está verificando, se sirve lo que hay (salvo la primera vez)
+        if not self._lock.acquire(blocking=self._stamp is None):
+            return self._datos
+        try:
+            if self._stamp is not None and time.monotonic() < self._proximo:
+                return self._datos
+            self._proximo = time.monotonic() + self._recarga
+            # Con copia de lectura se lee de la copia del request (como los demás
+            # catálogos); cada generación nueva se verifica una vez
+            snap = fuente_lectura()
+            stamp = f"L{snap.gen}" if snap is not None else _db_stamp()
+            if stamp == self._stamp:
+                return self._datos
+            with get_read_connection() as conn:
+                with closing(conn.cursor()) as cursor:
+                    firma = self._leer_firma(cursor)
+                    if firma is None or firma != self._firma:
+                        t0 = time.perf_counter()
+                        self._datos = self._cargar(cursor)
+                        self.carga_ms = (time.perf_counter() - t0) * 1000
+                        self.cargas += 1
+                        self._firma = firma
+                        app.logger.info("Calendarios anuales cargados en %.1f ms: %s", self.carga_ms,
+                                        {t: sum(len(a["eventos"]) for a in d.values())
+                                         for t, d in self._datos.items()})
+            self._stamp = stamp
+            return self._datos
+        finally:
+            self._lock.release()
+
+    def anio(self, tipo: str, anio: int) -> dict:
+        return self.vigentes().get(tipo, {}).get(anio) or _CALENDARIO_VACIO
+
+    def versiones(self) -> dict:
+        return {tipo: {str(a): d["version"] for a, d in sorted(anios.items())}
+                for tipo, anios in self.vigentes().items()}
+
+    def rango(self, tipo: str, desde, hasta):
+        """Eventos en [desde, hasta) (como el WHERE de las consultas por rango) y su ETag."""
+        anios = self.vigentes().get(tipo, {})
+        a0 = int(desde[:4]) if desde else min(anios, default=0)
+        a1 = int(hasta[:4]) if hasta else max(anios, default=0)
+        sel = [(a, anios[a]) for a in range(a0, a1 + 1) if a in anios]
+        eventos = [ev for _, d in sel for ev in d["eventos"]
+                   if (not desde or ev["start"] >= desde) and (not hasta or ev["start"] < hasta)]
+        base = "|".join([tipo, str(desde), str(hasta)] + [f"{a}:{d['version']}" for a, d in sel])
+        return eventos, hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+    def stats(self) -> dict:
+        return {
+            "cargas": self.cargas,
+            "carga_ms": round(self.carga_ms, 1),
+            "anios": {tipo: len(anios) for tipo, anios in self._datos.items()},
+            "eventos": {tipo: sum(len(a["eventos"]) for a in anios.values())
+                        for tipo, anios in self._datos.items()},
+        }
+
+_CALENDARIO_VACIO = CalendariosAnuales._anio([])
+calendarios = CalendariosAnuales(CALENDARIOS, CALENDARIOS_RECARGA_SEG)
+
+@app.get("/api/calendarios")
+def api_calendarios():
+    """Versión vigente de cada año: { success, feriados: {"2025": "ab12…"}, ausencias: {…} }."""
+    try:
+        versiones = calendarios.versiones()
+    except Exception:
+        app.logger.exception("Error en /api/calendarios")
+        return jsonify({"success": False, "message": "Error interno"}), 500
+    etag = hashlib.sha1(json.dumps(versiones, sort_keys=True).encode("utf-8")).hexdigest()
+    resp_304 = no_modificado(etag)
+    if resp_304 is not None:
+        return resp_304
+    return con_etag(jsonify({"success": True, **versiones}), etag)
+
+@app.get("/api/<any(feriados, ausencias):tipo>/<int:anio>.json")
+def calendario_anual(tipo, anio):
+    """
+    Eventos de un año, listos para FullCalendar. Con ?v= igual a la versión
+    vigente la respuesta es inmutable (caché de un año); sin ?v= o con una
+    versión vieja se devuelve lo vigente con revalidación (no-cache).
+    """
+    try:
+        datos = calendarios.anio(tipo, anio)
+    except Exception:
+        app.logger.exception("Error en /api/%s/%s.json", tipo, anio)
+        return jsonify([]), 500
+
+    resp = no_modificado(datos["version"])
+    if resp is None:
+        resp = con_etag(app.response_class(datos["json"], mimetype="application/json"), datos["version"])
+    if request.args.get("v") == datos["version"]:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
 # -----------------------------------------------------------------------------
 # API: FERIADOS
 # -----------------------------------------------------------------------------
+# Por rango (?start=&end=), armado desde los calendarios anuales sin tocar la base
 @app.route("/api/feriados")
 def feriados():
     try:
-        with get_connection() as conn:
-            with closing(conn.cursor()) as cursor:
-                cursor.execute("SELECT fecha, title FROM feriado")
-                rows = cursor.fetchall()
+        desde, hasta = rango_fechas()
+    except ValueError:
+        return jsonify([]), 400
 
-        feriados = [{
-            "title": row["title"],
-            "start": str(row["fecha"]).split(" ")[0] if row["fecha"] else None,
-            "display": "background",
-            "order": "002",
-            "classNames": ["fc-holiday"]
-        } for row in rows]
+    try:
+        feriados, etag = calendarios.rango("feriados", desde, hasta)
+        resp_304 = no_modificado(etag)
+        if resp_304 is not None:
+            return resp_304
 
         ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        app.logger.info(f"/api/feriados: {len(feriados)} feriados devueltos | IP: {ip}")
-        return jsonify(feriados)
+        app.logger.info("/api/feriados: %s feriados devueltos | IP: %s", len(feriados), ip)
+        return con_etag(jsonify(feriados), etag)
     except Exception:
         app.logger.exception("Error en /api/feriados")
         return jsonify([]), 500
@@ -392,22 +2744,19 @@ def feriados():
 @app.route("/api/ausencias")
 def ausencias():
     try:
-        with get_connection() as conn:
-            with closing(conn.cursor()) as cursor:
-                cursor.execute("SELECT fecha, usuario FROM ausencia")
-                rows = cursor.fetchall()
+        desde, hasta = rango_fechas()
+    except ValueError:
+        return jsonify([]), 400
 
-        eventos = [{
-            "title": f"Ausente: {row['usuario']}",
-            "start": str(row["fecha"]).split(" ")[0] if row["fecha"] else None,
-            "allDay": True,
-            "order": "001",
-            "classNames": ["evento-ausente"]
-        } for row in rows]
+    try:
+        eventos, etag = calendarios.rango("ausencias", desde, hasta)
+        resp_304 = no_modificado(etag)
+        if resp_304 is not None:
+            return resp_304
 
         ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        app.logger.info(f"/api/ausencias: {len(eventos)} ausencias devueltas | IP: {ip}")
-        return jsonify(eventos)
+        app.logger.info("/api/ausencias: %s ausencias devueltas | IP: %s", len(eventos), ip)
+        return con_etag(jsonify(eventos), etag)
     except Exception:
         app.logger.exception("Error en /api/ausencias")
         return jsonify([]), 500
@@ -422,9 +2771,8 @@ def update_fecha():
     nueva_fecha = data.get("fecha")
     clave = data.get("clave")
 
-    CLAVE_CORRECTA = "Sanlorenzo"
-    if clave != CLAVE_CORRECTA:
-        app.logger.warning(f"Clave incorrecta para id_tarea={id_tarea}")
+    if clave != CLAVE_EDICION:
+        app.logger.warning("Clave incorrecta para id_tarea=%s", id_tarea)
         return jsonify({"success": False, "message": "Contraseña incorrecta."}), 403
 
     try:
@@ -432,12 +2780,13 @@ def update_fecha():
             with closing(conn.cursor()) as cursor:
                 cursor.execute("UPDATE tarea SET fecha = ? WHERE id_tarea = ?", (nueva_fecha, id_tarea))
                 conn.commit()
+        tarea_modificada("U", id_tarea)
 
         ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        app.logger.info(f"Fecha actualizada para id_tarea={id_tarea} -> {nueva_fecha} | IP: {ip}")
+        app.logger.info("Fecha actualizada para id_tarea=%s -> %s | IP: %s", id_tarea, nueva_fecha, ip)
         return jsonify({"success": True})
     except Exception:
-        app.logger.exception(f"Error al actualizar fecha para id_tarea={id_tarea}")
+        app.logger.exception("Error al actualizar fecha para id_tarea=%s", id_tarea)
         return jsonify({"success": False, "message": "Error interno"}), 500
 
 # -----------------------------------------------------------------------------
@@ -449,7 +2798,7 @@ def editar_tarea():
     id_tarea = data.get("id_tarea")
     clave = data.get("clave", "").strip()
 
-    if clave != "Sanlorenzo":
+    if clave != CLAVE_EDICION:
         return jsonify({"success": False, "message": "⚠️ Contraseña incorrecta."})
 
     campos = [
@@ -466,11 +2815,12 @@ def editar_tarea():
                 valores = [data.get(c) for c in campos] + [id_tarea]
                 cursor.execute(f"UPDATE tarea SET {set_clauses} WHERE id_tarea = ?", valores)
                 conn.commit()
+        tarea_modificada("U", id_tarea)
         ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        app.logger.info(f"Tarea actualizada (id={id_tarea}) desde {ip}")
+        app.logger.info("Tarea actualizada (id=%s) desde %s", id_tarea, ip)
         return jsonify({"success": True})
     except Exception as e:
-        app.logger.exception(f"Error actualizando tarea (id={id_tarea})")
+        app.logger.exception("Error actualizando tarea (id=%s)", id_tarea)
         return jsonify({"success": False, "message": str(e)}), 500
 
 # -----------------------------------------------------------------------------
@@ -481,7 +2831,7 @@ def crear_tarea():
     data = request.get_json()
     clave = data.get("clave", "").strip()
 
-    if clave != "Sanlorenzo":
+    if clave != CLAVE_EDICION:
         return jsonify({"success": False, "message": "⚠️ Contraseña incorrecta."})
 
     campos = [
@@ -498,15 +2848,170 @@ def crear_tarea():
                 placeholders = ", ".join(["?"] * len(campos))
                 valores = [data.get(c) for c in campos]
                 cursor.execute(f"INSERT INTO tarea ({columnas}) VALUES ({placeholders})", valores)
+                nuevo_id = cursor.lastrowid
                 conn.commit()
+        tarea_modificada("I", nuevo_id)
         return jsonify({"success": True})
     except Exception as e:
         app.logger.exception("Error creando nueva tarea")
         return jsonify({"success": False, "message": str(e)}), 500
 
+# -----------------------------------------------------------------------------
+# API: TAREAS EN LOTE (crear copias / mover fechas)
+# -----------------------------------------------------------------------------
+# Todo el lote va en una sola transacción: un commit (un fsync) en vez de N.
+# La respuesta trae un resultado por ítem, en el mismo orden que el pedido.
+LOTE_MAX_ITEMS = int(os.environ.get("LOTE_MAX_ITEMS", "500"))
+
+CAMPOS_TAREA = [
+    "fecha", "ut", "tarea", "tipo", "ajuste", "horario", "lugar", "marca", "modelo",
+    "pedido", "responsable", "lado", "cuenta",
+    "tx_zona", "rx_zona", "tx_protection", "rx_protection",
+    "estado", "comentario"
+]
+
+def _lote(data, clave_lista: str):
+    """Valida cuerpo, clave y tamaño. Devuelve (items, None) o (None, respuesta de error)."""
+    if not isinstance(data, dict):
+        return None, (jsonify({"success": False, "message": "Se esperaba un objeto JSON"}), 400)
+    if not isinstance(data.get("clave"), str):
+        return None, (jsonify({"success": False, "message": "Falta 'clave'"}), 400)
+    if data["clave"].strip() != CLAVE_EDICION:
+        return None, (jsonify({"success": False, "message": "⚠️ Contraseña incorrecta."}), 403)
+    items = data.get(clave_lista)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"success": False, "message": f"'{clave_lista}' debe ser una lista no vacía"}), 400)
+    if len(items) > LOTE_MAX_ITEMS:
+        return None, (jsonify({"success": False, "message": f"Máximo {LOTE_MAX_ITEMS} ítems por lote"}), 400)
+    return items, None
+
+def _fecha_item(item):
+    """Fecha 'YYYY-MM-DD' del ítem, o None si falta o es inválida."""
+    try:
+        return _parse_fecha_param(str(item.get("fecha") or ""))
+    except ValueError:
+        return None
+
+@app.route("/api/crear_tareas", methods=["POST"])
+def crear_tareas():
+    data = request.get_json(silent=True) or {}
+    items, error = _lote(data, "tareas")
+    if error:
+        return error
+
+    resultados, validos = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            resultados.append({"index": i, "success": False, "message": "Ítem inválido"})
+            continue
+        fecha = _fecha_item(item)
+        if fecha is None:
+            resultados.append({"index": i, "success": False, "message": "Fecha inválida"})
+            continue
+        resultados.append({"index": i, "success": True})
+        validos.append((i, [fecha] + [item.get(c) for c in CAMPOS_TAREA[1:]]))
+
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    nuevos = []
+    try:
+        if validos:
+            sql = (f"INSERT INTO tarea ({', '.join(CAMPOS_TAREA)}) "
+                   f"VALUES ({', '.join(['?'] * len(CAMPOS_TAREA))})")
+            with get_connection() as conn:
+                with closing(conn.cursor()) as cursor:
+                    # execute por fila (misma transacción) para devolver el id de cada copia
+                    for i, valores in validos:
+                        cursor.execute(sql, valores)
+                        resultados[i]["id"] = cursor.lastrowid
+                        nuevos.append(cursor.lastrowid)
+                    conn.commit()
+            tarea_modificada("I", nuevos)
+    except Exception:
+        app.logger.exception("Error creando lote de %s tareas", len(validos))
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+    app.logger.info("Lote creado: %s/%s tareas | IP: %s", len(nuevos), len(items), ip)
+    return jsonify({"success": len(nuevos) == len(items), "creadas": len(nuevos), "items": resultados})
+
+@app.route("/api/update_fechas", methods=["POST"])
+def update_fechas():
+    data = request.get_json(silent=True) or {}
+    items, error = _lote(data, "items")
+    if error:
+        return error
+
+    resultados, cambios = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            resultados.append({"index": i, "id": None, "success": False, "message": "Ítem inválido"})
+            continue
+        id_tarea = item.get("id")
+        fecha = _fecha_item(item)
+        try:
+            id_tarea = int(id_tarea)
+        except (TypeError, ValueError):
+            resultados.append({"index": i, "id": id_tarea, "success": False, "message": "Id inválido"})
+            continue
+        if fecha is None:
+            resultados.append({"index": i, "id": id_tarea, "success": False, "message": "Fecha inválida"})
+            continue
+        resultados.append({"index": i, "id": id_tarea, "success": True})
+        cambios.append((i, id_tarea, fecha))
+
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    movidas = []
+    try:
+        if cambios:
+            with get_connection() as conn:
+                with closing(conn.cursor()) as cursor:
+                    ids = sorted({c[1] for c in cambios})
+                    cursor.execute(
+                        f"SELECT id_tarea FROM tarea WHERE id_tarea IN ({', '.join(['?'] * len(ids))})", ids
+                    )
+                    existentes = {r["id_tarea"] for r in cursor.fetchall()}
+                    for i, id_tarea, _ in cambios:
+                        if id_tarea not in existentes:
+                            resultados[i].update(success=False, message="No existe")
+                    filas = [(fecha, id_tarea) for _, id_tarea, fecha in cambios if id_tarea in existentes]
+                    cursor.executemany("UPDATE tarea SET fecha = ? WHERE id_tarea = ?", filas)
+                    conn.commit()
+            movidas = [id_tarea for _, id_tarea in filas]
+            if movidas:
+                tarea_modificada("U", movidas)
+    except Exception:
+        app.logger.exception("Error moviendo lote de %s tareas", len(cambios))
+        return jsonify({"success": False, "message": "Error interno"}), 500
+
+    app.logger.info("Lote de fechas actualizado: %s/%s tareas | IP: %s", len(movidas), len(items), ip)
+    return jsonify({"success": len(movidas) == len(items), "actualizadas": len(movidas), "items": resultados})
+
 # -----------------------------------------------------------------------------
 # API: CROMO
 # -----------------------------------------------------------------------------
+# Columna de carpeta de 'ruta', descubierta una vez por versión de esquema
+# (PRAGMA schema_version solo lee el encabezado de la DB; cambia con cada DDL).
+_ruta_col_cache = {"schema": None, "col": None}
+_ruta_col_lock = threading.Lock()
+
+def columna_carpeta_ruta(cur):
+    cur.execute("PRAGMA schema_version")
+    schema = cur.fetchone()[0]
+    with _ruta_col_lock:
+        if _ruta_col_cache["schema"] == schema:
+            return _ruta_col_cache["col"]
+
+    cur.execute("PRAGMA table_info(ruta)")
+    nombres = {row["name"].lower() for row in cur.fetchall()}
+    ruta_col = None
+    for cand in ("carpeta", "ruta", "path", "directorio", "folder"):
+        if cand in nombres:
+            ruta_col = cand
+            break
+
+    with _ruta_col_lock:
+        _ruta_col_cache.update(schema=schema, col=ruta_col)
+    return ruta_col
+
 @app.get("/api/cromo")
 def api_cromo():
     lado = (request.args.get("lado") or "").strip()
@@ -516,16 +3021,11 @@ def api_cromo():
     lado_norm = lado.replace(" ", "").replace("-", "")
 
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cur = conn.cursor()
-            cur.execute("PRAGMA table_info(ruta)")
-            nombres = {row["name"].lower() for row in cur.fetchall()}
-            ruta_col = None
-            for cand in ("carpeta", "ruta", "path", "directorio", "folder"):
-                if cand in nombres:
-                    ruta_col = cand
-                    break
+            ruta_col = columna_carpeta_ruta(cur)
 
+            # Ambos predicados coinciden con idx_cromo_lado_norm / idx_ruta_ut_text
             if ruta_col:
                 sql = f"""
                     SELECT c.*, r.{ruta_col} AS Carpeta
@@ -562,12 +3062,186 @@ def api_cromo():
         app.logger.exception("Error en /api/cromo")
         return jsonify({"success": False, "message": "DB error", "detail": str(e)}), 500
 
+# -----------------------------------------------------------------------------
+# ARRANQUE (esquema, precalentamiento) Y SONDAS /healthz /readyz
+# -----------------------------------------------------------------------------
+# Corre una vez por proceso, en segundo plano mientras waitress ya escucha:
+# /readyz responde 503 hasta que termina, así el balanceador no manda tráfico
+# a un proceso frío tras un reinicio. Si el servidor WSGI no lo lanza (test
+# client, otro servidor), lo dispara el primer request.
+ARRANQUE_PRECALENTAR = os.environ.get("ARRANQUE_PRECALENTAR", "1") == "1"
+
+# Tablas/columnas sin las que la app no funciona; las demás solo se advierten
+ESQUEMA_REQUERIDO = {
+    "tarea": {"id_tarea", "fecha", *CAMPOS_TAREA, *PROPS_LISTA},
+    "usuario": {"id_usuario", "nombre_usuario", "clave_hash", "rol", "activo",
+                "intentos_fallidos", "bloqueado_hasta", "ultimo_login", "fecha_actualizacion"},
+    "feriado": {"fecha", "title"},
+    "ausencia": {"fecha", "usuario"},
+}
+ESQUEMA_OPCIONAL = ("centro", "seccionador", "cromo", "ruta")
+
+arranque_estado = {"iniciado": False, "listo": False, "error": None, "advertencias": [],
+                   "fases_ms": {}, "total_ms": None}
+_arranque_lock = threading.Lock()
+
+def validar_esquema(conn):
+    """Devuelve (errores, advertencias) comparando la base con ESQUEMA_REQUERIDO."""
+    errores, advertencias = [], []
+    for tabla, columnas in ESQUEMA_REQUERIDO.items():
+        existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+        if not existentes:
+            errores.append(f"falta la tabla '{tabla}'")
+        elif columnas - existentes:
+            errores.append(f"'{tabla}' sin columnas: {', '.join(sorted(columnas - existentes))}")
+    for tabla in ESQUEMA_OPCIONAL:
+        if not conn.execute(f"PRAGMA table_info({tabla})").fetchone():
+            advertencias.append(f"falta la tabla '{tabla}' (lookup/cromo sin datos)")
+    return errores, advertencias
+
+def _rango_mes_visible(hoy):
+    """Lo que pide FullCalendar en dayGridMonth (firstDay=1, 6 semanas)."""
+    primero = hoy.replace(day=1)
+    inicio = primero - timedelta(days=primero.weekday())
+    return inicio.isoformat(), (inicio + timedelta(days=42)).isoformat()
+
+def _precalentar_paginas() -> int:
+    """Lee el archivo de la base (hasta DB_MMAP_MB) para traerlo al page cache del SO."""
+    leidos, limite = 0, max(DB_MMAP_MB, 1) * 1048576
+    with open(DB_PATH, "rb") as f:
+        while leidos < limite:
+            bloque = f.read(1048576)
+            if not bloque:
+                break
+            leidos += len(bloque)
+    return leidos
+
+def _precalentar_caches():
+    """
+    Pide lo que carga el navegador al abrir el calendario por el mismo camino
+    que un request real (ETag, caché de feeds, compresión → mismas claves).
+    """
+    hoy = datetime.now().date()
+    desde, hasta = _rango_mes_visible(hoy)
+    rutas = [
+        f"/api/tareas?start={desde}&end={hasta}",
+        f"/api/stats?anio={hoy.year}",
+        "/api/calendarios",
+        f"/api/feriados/{hoy.year}.json",
+        f"/api/ausencias/{hoy.year}.json",
+    ]
+    cliente = app.test_client()
+    for ruta in rutas:
+        resp = cliente.get(ruta, headers={"Accept-Encoding": "br, gzip", "X-Forwarded-For": "arranque"})
+        resp.close()
+        if resp.status_code != 200:
+            arranque_estado["advertencias"].append(f"precalentar {ruta}: HTTP {resp.status_code}")
+
+def arranque():
+    t0 = time.perf_counter()
+    fases = arranque_estado["fases_ms"]
+
+    def fase(nombre, fn):
+        t = time.perf_counter()
+        resultado = fn()
+        fases[nombre] = round((time.perf_counter() - t) * 1000, 1)
+        return resultado
+
+    try:
+        def esquema():
+            # La primera conexión aplica PRAGMAs y migraciones (ensure_schema)
+            with get_connection() as conn:
+                return validar_esquema(conn)
+        errores, advertencias = fase("esquema", esquema)
+        arranque_estado["advertencias"].extend(advertencias)
+        for a in advertencias:
+            app.logger.warning("Esquema: %s", a)
+        if errores:
+            raise RuntimeError("Esquema inválido: " + "; ".join(errores))
+
+        # Abre todas las conexiones del pool: los primeros requests no pagan el connect
+        arranque_estado["pool_abiertas"] = fase("pool", db_pool.precalentar)
+
+        def plantillas():
+            for nombre in ("index.html", "login.html"):
+                app.jinja_env.get_template(nombre)
+            # index.html con url_for → calcula los hashes de los estáticos
+            with app.test_request_context("/"):
+                render_template("index.html", username="", role="")
+        fase("plantillas", plantillas)
+
+        if ARRANQUE_PRECALENTAR:
+            arranque_estado["paginas_bytes"] = fase("paginas", _precalentar_paginas)
+            fase("caches", _precalentar_caches)
+
+        arranque_estado["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        arranque_estado["listo"] = True
+        app.logger.info("Arranque listo en %.0f ms | %s", arranque_estado["total_ms"],
+                        " ".join(f"{k}={v:.0f}ms" for k, v in fases.items()))
+    except Exception as e:
+        arranque_estado["error"] = str(e)
+        app.logger.exception("Falló el arranque: /readyz queda en 503")
+
+def iniciar_arranque(en_segundo_plano: bool = True):
+    with _arranque_lock:
+        if arranque_estado["iniciado"]:
+            return
+        arranque_estado["iniciado"] = True
+    configurar_logs()
+    if en_segundo_plano:
+        threading.Thread(target=arranque, name="arranque", daemon=True).start()
+    else:
+        arranque()
+
+@app.before_request
+def _arranque_pendiente():
+    if not arranque_estado["iniciado"]:
+        iniciar_arranque()
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: el proceso atiende requests (no toca la base)."""
+    resp = jsonify({"status": "ok"})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 recién cuando terminaron esquema y precalentamiento; antes, 503."""
+    listo = arranque_estado["listo"]
+    resp = jsonify({"status": "ok" if listo else ("error" if arranque_estado["error"] else "arrancando"),
+                    **arranque_estado})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp, 200 if listo else 503
+
 # -----------------------------------------------------------------------------
 # MAIN
 # -----------------------------------------------------------------------------
+# waitress en producción. Con FLASK_DEBUG=1 se usa el servidor de desarrollo.
+# Conviene WAITRESS_THREADS ≈ DB_POOL_SIZE (+ SSE_MAX_CLIENTES): cada hilo que
+# atiende un feed toma una conexión, y cada cliente SSE retiene un hilo.
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "5000"))
+WAITRESS_THREADS = int(os.environ.get("WAITRESS_THREADS", "8"))
+WAITRESS_CONNECTION_LIMIT = int(os.environ.get("WAITRESS_CONNECTION_LIMIT", "200"))
+WAITRESS_CHANNEL_TIMEOUT = int(os.environ.get("WAITRESS_CHANNEL_TIMEOUT", "60"))
+WAITRESS_BACKLOG = int(os.environ.get("WAITRESS_BACKLOG", "1024"))
+
 if __name__ == '__main__':
     print("Ruta absoluta DB:", os.path.abspath(DB_PATH))
     print("¿Existe DB?", os.path.exists(DB_PATH))
-    app.logger.info(f"Ruta DB: {os.path.abspath(DB_PATH)} | Existe: {'Sí' if os.path.exists(DB_PATH) else 'No'}")
-    app.run(host='0.0.0.0', port=5000, debug=True)
-    #serve(app, host="0.0.0.0", port=5000)
+    iniciar_arranque()   # logs ya; esquema y precalentamiento en segundo plano (/readyz)
+    app.logger.info("Ruta DB: %s | Existe: %s", os.path.abspath(DB_PATH), "Sí" if os.path.exists(DB_PATH) else "No")
+    if os.environ.get("FLASK_DEBUG") == "1":
+        app.run(host=HOST, port=PORT, debug=True)
+    else:
+        from waitress import serve   # solo hace falta al servir (importar el módulo no la carga)
+        app.logger.info("waitress en %s:%s | hilos=%s conexiones=%s timeout=%ss backlog=%s",
+                        HOST, PORT, WAITRESS_THREADS, WAITRESS_CONNECTION_LIMIT,
+                        WAITRESS_CHANNEL_TIMEOUT, WAITRESS_BACKLOG)
+        serve(app, host=HOST, port=PORT,
+              threads=WAITRESS_THREADS,
+              connection_limit=WAITRESS_CONNECTION_LIMIT,
+              channel_timeout=WAITRESS_CHANNEL_TIMEOUT,
+              backlog=WAITRESS_BACKLOG,
+              asyncore_use_poll=True)   # poll(): sin el tope de 1024 fds de select()
@@ -4,8 +4,14 @@
  * ----------------------------------------------------------------------------
  *  Capa de acceso a API (fetch centralizado).
  *  Los endpoints están definidos en tu backend Flask (sin cambios).
- *  - GET  /api/tareas, /api/ausencias, /api/feriados
+ *  - GET  /api/tareas, /api/ausencias, /api/feriados  (?start=&end= | ?all=1)
+ *  - GET  /api/calendarios, /api/feriados/:año.json?v=, /api/ausencias/:año.json?v=
+ *  - GET  /api/tareas/changes?since=   (delta desde un token de sync)
+ *  - GET  /api/tareas/:id               (fila completa, para el modal)
+ *  - GET  /api/tareas/search?q=&page=&per_page=   (búsqueda en todo el historial)
+ *  - GET  /api/stats?anio=, /api/stats/ensayos?anio=&estado=&page=&per_page=
  *  - POST /api/update_fecha, /api/editar_tarea, /api/crear_tarea
+ *  - POST /api/crear_tareas, /api/update_fechas   (lotes, una transacción)
  *  - GET  /api/ubicacion_lookup?ut=&tipo=
  *  - GET  /api/cromo?lado=
  * ============================================================================
@@ -16,9 +22,25 @@ const asJson = async (res) => {
   return res.json();
 };
 
-export const getTareas    = () => fetch('/api/tareas').then(asJson);
+const qs = (params) => {
+  const q = new URLSearchParams(params || {}).toString();
+  return q ? `?${q}` : '';
+};
+
+// Sin params → historial completo; con { start, end } → solo ese rango
+export const getTareas    = (params) => fetch(`/api/tareas${qs(params)}`).then(asJson);
+export const getTarea     = (id) => fetch(`/api/tareas/${encodeURIComponent(id)}`).then(asJson);
+export const getTareasChanges = (since) =>
+  fetch(`/api/tareas/changes?since=${encodeURIComponent(since ?? '')}`).then(asJson);
+export const searchTareas = (params) => fetch(`/api/tareas/search${qs(params)}`).then(asJson);
+export const getStats     = (anio) => fetch(`/api/stats${qs({ anio })}`).then(asJson);
+export const getEnsayos   = (params) => fetch(`/api/stats/ensayos${qs(params)}`).then(asJson);
 export const getAusencias = () => fetch('/api/ausencias').then(asJson);
 export const getFeriados  = () => fetch('/api/feriados').then(asJson);
+export const getCalendarios = () => fetch('/api/calendarios').then(asJson);
+// Con la versión en la URL el navegador la guarda como inmutable (no vuelve a pedirla)
+export const getCalendarioAnual = (tipo, anio, v) =>
+  fetch(`/api/${tipo}/${anio}.json${qs({ v })}`).then(asJson);
 
 export const postUpdateFecha = (payload) =>
   fetch('/api/update_fecha', {
@@ -34,6 +56,20 @@ export const postCrearTarea = (payload) =>
     body: JSON.stringify(payload)
   }).then(asJson);
 
+export const postCrearTareas = (payload) =>
+  fetch('/api/crear_tareas', {
+    method:'POST',
+    headers:{ 'Content-Type':'application/json' },
+    body: JSON.stringify(payload)
+  }).then(asJson);
+
+export const postUpdateFechas = (payload) =>
+  fetch('/api/update_fechas', {
+    method:'POST',
+    headers:{ 'Content-Type':'application/json' },
+    body: JSON.stringify(payload)
+  }).then(asJson);
+
 export const postEditarTarea = (payload) =>
   fetch('/api/editar_tarea', {
     method:'POST',
@@ -3,18 +3,31 @@
  *  calendar.js
  * ----------------------------------------------------------------------------
  *  Configuración y wiring de FullCalendar:
- *   - eventSources (tareas/ausencias/feriados)
- *   - filtros por tipo + búsqueda por UT/Ajuste
+ *   - eventSources (tareas + feriados/ausencias por año, ver yearly.js)
+ *   - filtros por tipo + búsqueda por UT/Ajuste (y en todo el historial vía /api/tareas/search)
  *   - eventClick → abre modal de lectura
  *   - eventDrop  → mover fecha con contraseña
+ *   - sync incremental: aplica deltas de /api/tareas/changes sin refetch
+ *   - push en vivo (SSE /api/stream) dispara el sync; polling si no hay SSE
  * ============================================================================
  */
 
-import { setCalendar, setLastRawEvents } from './state.js';
+import {
+  setCalendar, setLastRawEvents, invalidateYearStats,
+  syncToken, setSyncToken, mergeRawEvents
+} from './state.js';
 import { askPassword } from './password.js';
-import { postUpdateFecha } from './api.js';
+import { postUpdateFecha, getTareasChanges, searchTareas } from './api.js';
 import { updateEnsayoCounter } from './counters.js';
 import { showEditableModal } from './modals.js';
+import { yearlySource, invalidateYearly } from './yearly.js';
+
+const SEARCH_DEBOUNCE_MS = 250;
+const SEARCH_PAGE_SIZE = 50;
+
+// Ids que devolvió la búsqueda en el servidor (coinciden en comentario, lugar, etc.)
+let searchIds = new Set();
+let searchSeq = 0;
 
 function normalize(s) {
   return (s || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toUpperCase();
@@ -30,8 +43,93 @@ function isAllowedByFilters(tipoTexto) {
   return false;
 }
 
-function searchAndGoto(calendar) {
-  const value = (document.getElementById('search-input')?.value || '').toLowerCase();
+function currentQuery() {
+  return (document.getElementById('search-input')?.value || '').toLowerCase();
+}
+
+function passesFilters(ev, query = currentQuery()) {
+  const allowed = isAllowedByFilters(ev.title || '');
+  const ut = (ev.extendedProps?.ut || '').toLowerCase();
+  const ajuste = (ev.extendedProps?.ajuste || '').toLowerCase();
+  const match = !query || ut.includes(query) || ajuste.includes(query) || searchIds.has(String(ev.id));
+  return allowed && match;
+}
+
+// ===== Sincronización incremental (deltas en lugar de refetch completo) =====
+const SYNC_INTERVAL_MS = 10000;
+const LIVE_RETRY_MS = 60000;
+let syncing = false;
+let syncPending = false;   // llegó un aviso mientras se sincronizaba
+let liveConnected = false;
+
+export async function syncChanges(calendar) {
+  if (!calendar || !syncToken) return;
+  if (syncing) { syncPending = true; return; }
+  syncing = true;
+  try {
+    const delta = await getTareasChanges(syncToken);
+    if (delta.reset) {
+      setSyncToken(null);          // lo repone el success del refetch
+      calendar.refetchEvents();
+      return;
+    }
+    const upserts = delta.upserts || [];
+    const deleted = delta.deleted || [];
+    if (upserts.length || deleted.length) {
+      const source = calendar.getEventSourceById('tareas');
+      calendar.batchRendering(() => {
+        for (const id of [...deleted, ...upserts.map(ev => ev.id)]) {
+          calendar.getEventById(String(id))?.remove();
+        }
+        const query = currentQuery();
+        for (const ev of upserts) {
+          if (passesFilters(ev, query)) calendar.addEvent(ev, source || undefined);
+        }
+      });
+      mergeRawEvents(upserts, deleted);
+      invalidateYearStats();
+      updateEnsayoCounter();
+    }
+    setSyncToken(delta.token);
+  } catch {
+    // Sin red: se reintenta en el próximo ciclo
+  } finally {
+    syncing = false;
+    if (syncPending) {
+      syncPending = false;
+      syncChanges(calendar);
+    }
+  }
+}
+
+function startDeltaSync(calendar) {
+  // Con SSE conectado el servidor avisa; el polling queda como respaldo
+  setInterval(() => {
+    if (!liveConnected && document.visibilityState === 'visible') syncChanges(calendar);
+  }, SYNC_INTERVAL_MS);
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible') syncChanges(calendar);
+  });
+}
+
+function startLiveUpdates(calendar) {
+  if (!('EventSource' in window)) return;
+  const es = new EventSource('/api/stream');
+  es.addEventListener('hola', () => { liveConnected = true; syncChanges(calendar); });
+  es.addEventListener('tarea', () => syncChanges(calendar));
+  es.addEventListener('resync', () => syncChanges(calendar));
+  es.onerror = () => {
+    liveConnected = false;
+    // CLOSED = el servidor rechazó (cupo lleno): polling y reintento más tarde.
+    // Si no, EventSource reconecta solo.
+    if (es.readyState === EventSource.CLOSED) {
+      setTimeout(() => startLiveUpdates(calendar), LIVE_RETRY_MS);
+    }
+  };
+}
+
+async function searchAndGoto(calendar) {
+  const value = (document.getElementById('search-input')?.value || '').trim().toLowerCase();
   if (!value) return;
   const events = calendar.getEvents();
   for (const ev of events) {
@@ -42,7 +140,19 @@ function searchAndGoto(calendar) {
       return;
     }
   }
-  // (sin alert para evitar ruido al tipear)
+
+  // No está en lo cargado: buscar en todo el historial (FTS en el servidor)
+  if (value.length < 2) return;
+  const seq = ++searchSeq;
+  try {
+    const res = await searchTareas({ q: value, per_page: SEARCH_PAGE_SIZE });
+    if (seq !== searchSeq || !res.items?.length) return;   // ya tipearon otra cosa
+    searchIds = new Set(res.items.map(it => String(it.id)));
+    calendar.gotoDate(res.items[0].start);                  // el más relevante
+    calendar.refetchEvents();
+  } catch {
+    // (sin alert para evitar ruido al tipear)
+  }
 }
 
 export function initCalendar() {
@@ -83,23 +193,19 @@ export function initCalendar() {
     },
 
     eventSources: [
-      { url: '/api/ausencias', failure: () => alert('Error al cargar ausencias') },
+      { ...yearlySource('ausencias'), failure: () => alert('Error al cargar ausencias') },
       {
+        id: 'tareas',
         url: '/api/tareas',
         failure: () => alert('Error al cargar tareas'),
-        success: (events) => {
+        success: (events, response) => {
           setLastRawEvents(events);
-          const query = (document.getElementById('search-input')?.value || '').toLowerCase();
-          return events.filter((ev) => {
-            const allowed = isAllowedByFilters(ev.title || '');
-            const ut = (ev.extendedProps.ut || '').toLowerCase();
-            const ajuste = (ev.extendedProps.ajuste || '').toLowerCase();
-            const match = !query || ut.includes(query) || ajuste.includes(query);
-            return allowed && match;
-          });
+          setSyncToken(response?.headers?.get('X-Sync-Token'));
+          const query = currentQuery();
+          return events.filter((ev) => passesFilters(ev, query));
         }
       },
-      { url: '/api/feriados', failure: () => alert('Error al cargar feriados') }
+      { ...yearlySource('feriados'), failure: () => alert('Error al cargar feriados') }
     ],
 
     editable: true,
@@ -188,15 +294,25 @@ export function initCalendar() {
   cal.render();
   installYearMonthPickers(cal);
   setCalendar(cal);
+  startDeltaSync(cal);
+  startLiveUpdates(cal);
 
   // Wiring de UI superiores
-  document.getElementById('refresh-btn')?.addEventListener('click', () => cal.refetchEvents());
+  document.getElementById('refresh-btn')?.addEventListener('click', () => {
+    invalidateYearStats();
+    invalidateYearly();
+    cal.refetchEvents();
+  });
 
   const searchInput = document.getElementById('search-input');
   if (searchInput) {
+    let searchTimer = null;
     searchInput.addEventListener('input', () => {
+      searchIds = new Set();
+      searchSeq++;
       cal.refetchEvents();
-      setTimeout(() => searchAndGoto(cal), 120);
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => searchAndGoto(cal), SEARCH_DEBOUNCE_MS);
     });
   }
 
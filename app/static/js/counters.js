@@ -2,62 +2,86 @@
  * ============================================================================
  *  counters.js
  * ----------------------------------------------------------------------------
- *  Contador y listado de "Ensayos" por año:
+ *  Contador y listado de "Ensayos" por año (calculados en el servidor):
+ *   - loadYearStats(year): conteos por tipo/estado (GET /api/stats?anio=)
  *   - updateEnsayoCounter(): actualiza el badge flotante
- *   - openEnsayoList(year): abre una tabla con filtros (EJECUTADO/PROGRAMADO/TODOS)
+ *   - openEnsayoList(year, page): tabla paginada con filtros (GET /api/stats/ensayos)
  *   - copyEnsayoTable(): copia al portapapeles (tabulado)
  * ============================================================================
  */
 
-import { calendar, lastRawEvents } from './state.js';
-import { esc, formatDateISO, normalize } from './utils.js';
+import { calendar, yearStats, setYearStats } from './state.js';
+import { getStats, getEnsayos } from './api.js';
+import { esc, formatDateISO } from './utils.js';
 import { showDetailsModal } from './modals.js';
 
-let ensayoListFilter = 'EJECUTADO'; // 'EJECUTADO' | 'PROGRAMADO' | 'TODOS'
+let ensayoListFilter = 'EJECUTADO'; // 'EJECUTADO' | 'PROGRAMADO' | 'SUSPENDIDO' | 'TODOS'
+let ensayoRows = [];                // página visible del listado (para el detalle 🔍)
+let statsLoading = null;            // { year, promise } → evita pedidos duplicados
 
-export function updateEnsayoCounter() {
+const ENSAYO_PAGE_SIZE = 200;
+
+export function loadYearStats(year) {
+  if (yearStats.year === year && !yearStats.stale) return Promise.resolve(yearStats.items);
+  if (statsLoading && statsLoading.year === year) return statsLoading.promise;
+
+  const promise = getStats(year)
+    .then((res) => { setYearStats(year, res.items); return yearStats.items; })
+    .finally(() => { if (statsLoading?.promise === promise) statsLoading = null; });
+  statsLoading = { year, promise };
+  return promise;
+}
+
+export async function updateEnsayoCounter() {
   const badge = document.getElementById('ensayo-counter');
   if (!badge || !calendar) return;
 
   const visibleYear = calendar.getDate().getFullYear();
-  const total = (lastRawEvents || []).reduce((acc, ev) => {
-    const y = parseInt((ev.start || '').slice(0, 4), 10);
-    const titleN = normalize(ev.title || '');
-    const estadoN = normalize(ev.extendedProps?.estado || '');
-    return acc + (y === visibleYear && titleN.includes('ENSAYO') && estadoN === 'EJECUTADO' ? 1 : 0);
-  }, 0);
+  let items;
+  try {
+    items = await loadYearStats(visibleYear);
+  } catch {
+    return;
+  }
+  if (calendar.getDate().getFullYear() !== visibleYear) return; // navegaron mientras cargaba
+
+  const total = (items || [])
+    .filter(it => it.anio === visibleYear && it.tipo === 'ENSAYO' && it.estado === 'EJECUTADO')
+    .reduce((acc, it) => acc + it.cantidad, 0);
 
   badge.textContent = `📊 Interruptores en ${visibleYear}: ${total}`;
 }
 
 export function setEnsayoFilter(newFilter, year) {
   ensayoListFilter = newFilter;
-  openEnsayoList(year);
+  openEnsayoList(year, 1);
 }
 
-export function openEnsayoList(year) {
+export async function openEnsayoList(year, page = 1) {
   const F = ensayoListFilter.toUpperCase();
 
-  const rows = (lastRawEvents || [])
-    .filter(ev => {
-      const y  = parseInt((ev.start || '').slice(0, 4), 10);
-      const t  = (ev.title || '').toUpperCase();
-      const st = (ev.extendedProps?.estado || '').toUpperCase();
-      if (y !== year || !t.includes('ENSAYO')) return false;
-      if (F === 'TODOS') return true;
-      return st === F;
-    })
-    .map(ev => ({
-      id:     ev.id, 
-      iso:    (ev.start || '').slice(0, 10),
-      ut:     ev.extendedProps?.ut || '',
-      lado:   ev.extendedProps?.lado || '',
-      cuenta: ev.extendedProps?.cuenta || '',
-      ajuste: ev.extendedProps?.ajuste || '',
-      marca:  ev.extendedProps?.marca || '',
-      modelo: ev.extendedProps?.modelo || ''
-    }))
-    .sort((a, b) => a.iso.localeCompare(b.iso));
+  let res;
+  try {
+    res = await getEnsayos({ anio: year, estado: F, page, per_page: ENSAYO_PAGE_SIZE });
+    if (!res.success) throw new Error(res.message);
+  } catch {
+    alert('Error al cargar el listado de ensayos.');
+    return;
+  }
+
+  const total = res.total || 0;
+  const pages = Math.max(1, Math.ceil(total / ENSAYO_PAGE_SIZE));
+  ensayoRows = res.items || [];
+  const rows = ensayoRows.map(it => ({
+    id:     it.id,
+    iso:    it.fecha || '',
+    ut:     it.ut || '',
+    lado:   it.lado || '',
+    cuenta: it.cuenta || '',
+    ajuste: it.ajuste || '',
+    marca:  it.marca || '',
+    modelo: it.modelo || ''
+  }));
 
   const btn = (label, val) => `
     <button
@@ -75,7 +99,7 @@ export function openEnsayoList(year) {
 
   const header = `
     <div class="modal-header">
-      <div class="modal-title">Interruptores ensayados en ${year} Total: ${rows.length}</div>
+      <div class="modal-title">Interruptores ensayados en ${year} Total: ${total}</div>
       <div style="display:flex; gap:8px; align-items:center;">
         ${btn('Ejecutados', 'EJECUTADO')}
         ${btn('Programados', 'PROGRAMADO')}
@@ -88,6 +112,16 @@ export function openEnsayoList(year) {
     <hr class="modal__divider" />
   `;
 
+  const pager = pages > 1 ? `
+    <div style="display:flex; gap:8px; align-items:center; justify-content:flex-end; margin:6px 0;">
+      <button ${page <= 1 ? 'disabled' : ''} onclick="openEnsayoList(${year}, ${page - 1})"
+        style="padding:3px 8px; border:1px solid #ccc; border-radius:4px; cursor:pointer;">◀</button>
+      <span style="font-size:12px;">Página ${page} de ${pages}</span>
+      <button ${page >= pages ? 'disabled' : ''} onclick="openEnsayoList(${year}, ${page + 1})"
+        style="padding:3px 8px; border:1px solid #ccc; border-radius:4px; cursor:pointer;">▶</button>
+    </div>
+  ` : '';
+
   const table = rows.length
     ? `
       <div style="max-height:55vh; overflow:auto;">
@@ -128,7 +162,7 @@ export function openEnsayoList(year) {
     `
     : `<div style="padding:6px 2px;">No hay ENSAYOS ${F==='TODOS'?'':'con estado '+F} en ${year}.</div>`;
 
-  showDetailsModal(header + table);
+  showDetailsModal(header + pager + table);
   document.getElementById('details-modal')?.classList.add('modal--wide');
 }
 
@@ -156,15 +190,15 @@ window.copyEnsayoTable = copyEnsayoTable;
 
 // Usa el mismo modal de lectura que el calendario
 window.openEnsayoDetail = function (evId) {
-  const ev = (lastRawEvents || []).find(e => String(e.id) === String(evId));
-  if (!ev) return alert('No se encontró el evento.');
+  const it = (ensayoRows || []).find(r => String(r.id) === String(evId));
+  if (!it) return alert('No se encontró el evento.');
 
-  // Arma el objeto en el formato que espera showEditableModal
+  // showEditableModal trae la fila completa (/api/tareas/:id) antes de mostrar
   const data = {
-    id: ev.id,
-    start: ev.start,
-    title: ev.title,
-    extendedProps: ev.extendedProps || {}
+    id: it.id,
+    start: it.fecha,
+    title: it.tarea,
+    extendedProps: {}
   };
 
   // Dejo currentEventRef por compatibilidad con botones ✏️/📄 en el header
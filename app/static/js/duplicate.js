@@ -2,16 +2,26 @@
  * ============================================================================
  *  duplicate.js
  * ----------------------------------------------------------------------------
- *  Diálogo de "Duplicar" y creación de copia usando /api/crear_tarea.
+ *  Diálogo de "Duplicar" y creación de copias usando /api/crear_tareas.
  *  Solo cambia fecha (y opcionalmente estado). Copia el resto de campos tal cual.
+ *  Con "Repeticiones" > 1 crea una serie (cada N días) en un solo pedido.
  * ============================================================================
  */
 
-import { calendar, currentEvent } from './state.js';
+import { calendar, currentEvent, invalidateYearStats } from './state.js';
 import { askPassword } from './password.js';
-import { postCrearTarea } from './api.js';
+import { postCrearTareas } from './api.js';
 import { showDetailsModal, hideDetailsModal } from './modals.js';
 
+const MAX_COPIAS = 200;
+
+// 'YYYY-MM-DD' + n días (en UTC para no depender del horario de verano)
+function addDaysISO(iso, n) {
+  const d = new Date(`${iso}T00:00:00Z`);
+  d.setUTCDate(d.getUTCDate() + n);
+  return d.toISOString().slice(0, 10);
+}
+
 export function openDuplicateDialog(evData) {
   const ev = evData || currentEvent;
   if (!ev) { alert('⚠️ No hay evento para duplicar.'); return; }
@@ -36,6 +46,12 @@ export function openDuplicateDialog(evData) {
         <option>SUSPENDIDO</option>
       </select>
 
+      <label for="dup-repeticiones">Repeticiones</label>
+      <input id="dup-repeticiones" type="number" min="1" max="${MAX_COPIAS}" value="1">
+
+      <label for="dup-intervalo">Cada (días)</label>
+      <input id="dup-intervalo" type="number" min="1" value="7">
+
       <div class="span-2" style="margin-top:8px; font-size:12px; opacity:.8;">
         Se copiarán todos los demás campos desde la tarea original (UT, tipo, marca, modelo, lugar, ajustes, horario, comentario y flags).
       </div>
@@ -56,6 +72,10 @@ export async function duplicateTask(taskId) {
   const fechaNueva  = (document.getElementById('dup-fecha')?.value || '').trim();
   const estadoNuevo = (document.getElementById('dup-estado')?.value || 'PROGRAMADO').trim();
   if (!fechaNueva) { alert('Elegí la nueva fecha.'); return; }
+  const repeticiones = parseInt(document.getElementById('dup-repeticiones')?.value, 10) || 1;
+  const intervalo    = parseInt(document.getElementById('dup-intervalo')?.value, 10) || 1;
+  if (repeticiones < 1 || repeticiones > MAX_COPIAS) { alert(`Repeticiones: entre 1 y ${MAX_COPIAS}.`); return; }
+  if (intervalo < 1) { alert('El intervalo debe ser de al menos 1 día.'); return; }
 
   const payload = {
     fecha: fechaNueva,
@@ -81,17 +101,28 @@ export async function duplicateTask(taskId) {
     partido: props.partido || ''
   };
 
-  const pass = await askPassword('Ingrese la contraseña para crear la copia:');
+  const tareas = Array.from({ length: repeticiones }, (_, i) =>
+    ({ ...payload, fecha: addDaysISO(fechaNueva, i * intervalo) }));
+
+  const msg = repeticiones > 1
+    ? `Ingrese la contraseña para crear ${repeticiones} copias:`
+    : 'Ingrese la contraseña para crear la copia:';
+  const pass = await askPassword(msg);
   if (!pass) return;
-  payload.clave = pass;
 
   try {
-    const res = await postCrearTarea(payload);
-    if (res.success) {
+    const res = await postCrearTareas({ clave: pass, tareas });
+    if (res.creadas) {
       hideDetailsModal();
+      invalidateYearStats();
       calendar?.refetchEvents();
-    } else {
-      alert(`❌ ${res.message || 'No se pudo crear la copia.'}`);
+    }
+    if (!res.success) {
+      const fallidas = (res.items || []).filter(it => !it.success);
+      alert(fallidas.length
+        ? `⚠️ Se crearon ${res.creadas} de ${tareas.length}. Fallaron: ` +
+          fallidas.map(it => `${tareas[it.index].fecha} (${it.message})`).join(', ')
+        : `❌ ${res.message || 'No se pudo crear la copia.'}`);
     }
   } catch {
     alert('❌ Error de red al duplicar.');
@@ -13,13 +13,13 @@
  * ============================================================================
  */
 
-import { calendar, currentEvent, setCurrentEvent } from './state.js';
+import { calendar, currentEvent, setCurrentEvent, invalidateYearStats } from './state.js';
 import {
   TYPE_OPTIONS, OBRADOR_OPTIONS, ESTADO_OPTIONS,
   fillSelect, getBrands, getModels,
   parseHorario, formatHorario, esc
 } from './utils.js';
-import { ubicacionLookup, postCrearTarea, postEditarTarea } from './api.js';
+import { ubicacionLookup, postCrearTarea, postEditarTarea, getTarea } from './api.js';
 import { askPassword } from './password.js';
 
 /* =======================
@@ -238,6 +238,18 @@ function renderField(label, key, value, isEdit, opts = {}) {
  * Modal principal
  * ======================= */
 export function showEditableModal(eventData, editable = false) {
+  // Los feeds traen una proyección liviana: la fila completa se pide al abrir
+  if (eventData?.id && !eventData.extendedProps?._full) {
+    getTarea(eventData.id)
+      .then((res) => {
+        if (!res.success || !res.item) throw new Error(res.message || 'Tarea no encontrada');
+        const props = { ...res.item.extendedProps, _full: true };
+        showEditableModal({ ...eventData, extendedProps: props }, editable);
+      })
+      .catch(() => alert('❌ No se pudo cargar el detalle de la tarea.'));
+    return;
+  }
+
   const dm = document.getElementById('details-modal');
   dm?.classList.add('modal--wide', 'modal__header--sticky');
 
@@ -616,6 +628,7 @@ async function saveEdition(taskId) {
     .then((res) => {
       if (res.success) {
         hideDetailsModal();
+        invalidateYearStats();
         calendar?.refetchEvents();
       } else {
         alert(`❌ ${res.message || 'No se pudo guardar.'}`);
@@ -6,7 +6,9 @@
  *  entre módulos sin contaminar window.
  *  - calendar: instancia de FullCalendar
  *  - currentEvent: último evento abierto en el modal
- *  - lastRawEvents: caché de eventos crudos (para contadores/listados)
+ *  - lastRawEvents: caché de eventos crudos del rango visible
+ *  - yearStats: conteos del año visible (para el contador de ensayos)
+ *  - syncToken: token de /api/tareas/changes (sincronización incremental)
  *  - passwordResolver: closure de resolución del modal de contraseña
  * ============================================================================
  */
@@ -20,6 +22,12 @@ export let currentEvent = null;
 /** @type {Array<any>} */
 export let lastRawEvents = [];
 
+/** @type {{ year: number|null, items: Array<any>, stale: boolean }} */
+export let yearStats = { year: null, items: [], stale: true };
+
+/** @type {string|null} */
+export let syncToken = null;
+
 /** @type {((value: string|null)=>void) | null} */
 export let passwordResolver = null;
 
@@ -27,8 +35,17 @@ export let passwordResolver = null;
 export function setCalendar(c)         { calendar = c; }
 export function setCurrentEvent(ev)    { currentEvent = ev; }
 export function setLastRawEvents(arr)  { lastRawEvents = Array.isArray(arr) ? arr : []; }
+export function setYearStats(year, arr) { yearStats = { year, items: Array.isArray(arr) ? arr : [], stale: false }; }
+export function invalidateYearStats()  { yearStats = { ...yearStats, stale: true }; }
+export function setSyncToken(t)        { syncToken = t ? String(t) : null; }
 export function setPasswordResolver(f) { passwordResolver = typeof f === 'function' ? f : null; }
 
+// Aplica un delta de /api/tareas/changes sobre lastRawEvents (idempotente)
+export function mergeRawEvents(upserts = [], deletedIds = []) {
+  const fuera = new Set([...deletedIds, ...upserts.map(ev => ev.id)].map(String));
+  lastRawEvents = lastRawEvents.filter(ev => !fuera.has(String(ev.id))).concat(upserts);
+}
+
 // Exponer mínimamente lo imprescindible para handlers inline heredados
 // (p.ej. el botón ✏️ en el header del modal usa currentEvent)
 window.currentEventRef = {
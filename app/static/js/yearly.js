@@ -0,0 +1,62 @@
+/**
+ * ============================================================================
+ *  yearly.js
+ * ----------------------------------------------------------------------------
+ *  Feriados y ausencias por año (eventSources de FullCalendar):
+ *   - /api/calendarios trae la versión vigente de cada año
+ *   - cada año se pide como /api/<tipo>/<año>.json?v=<versión> → caché inmutable
+ *   - en memoria queda cada año por versión: cambiar de mes no pide nada
+ * ============================================================================
+ */
+
+import { getCalendarios, getCalendarioAnual } from './api.js';
+
+const MANIFEST_TTL_MS = 60_000;
+
+let manifest = null;          // { feriados: { "2025": "ab12…" }, ausencias: { … } }
+let manifestAt = 0;
+let manifestPromise = null;
+const years = new Map();      // 'feriados/2025' → { v, events }
+
+function loadManifest() {
+  if (manifest && Date.now() - manifestAt < MANIFEST_TTL_MS) return Promise.resolve(manifest);
+  if (!manifestPromise) {
+    manifestPromise = getCalendarios()
+      .then((m) => { manifest = m; manifestAt = Date.now(); return m; })
+      .finally(() => { manifestPromise = null; });
+  }
+  return manifestPromise;
+}
+
+async function loadYear(tipo, year, v) {
+  if (!v) return [];                       // año sin datos
+  const key = `${tipo}/${year}`;
+  const hit = years.get(key);
+  if (hit && hit.v === v) return hit.events;
+  const events = await getCalendarioAnual(tipo, year, v);
+  years.set(key, { v, events });
+  return events;
+}
+
+/** Fuerza a releer las versiones en la próxima carga (botón Actualizar). */
+export function invalidateYearly() { manifestAt = 0; }
+
+/** eventSource para 'feriados' | 'ausencias': junta los años que toca el rango visible. */
+export function yearlySource(tipo) {
+  return {
+    id: tipo,
+    events: (info, success, failure) => {
+      const first = info.start.getFullYear();
+      const last = new Date(info.end.getTime() - 1).getFullYear();
+      loadManifest()
+        .then((m) => {
+          const versions = m[tipo] || {};
+          const pending = [];
+          for (let y = first; y <= last; y++) pending.push(loadYear(tipo, y, versions[y]));
+          return Promise.all(pending);
+        })
+        .then((lists) => success(lists.flat()))
+        .catch(failure);
+    }
+  };
+}
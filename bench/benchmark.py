@@ -0,0 +1,377 @@
+"""
+===============================================================================
+ Benchmark de app/server.py contra una base sintética
+ - Modo 'test': Flask test client en el mismo proceso (sin red)
+ - Modo 'waitress': servidor real en un subproceso + clientes HTTP
+ - Reporta p50/p95/p99, throughput y RSS pico en JSON
+===============================================================================
+Uso:
+    python bench/benchmark.py --tareas 20000 --concurrencia 1,8 --requests 200
+    python bench/benchmark.py --db /tmp/bench.sqlite --modo waitress --hilos 8 --salida resultado.json
+
+No necesita red externa: todo corre contra 127.0.0.1.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "app")
+sys.path.insert(0, BENCH_DIR)
+
+import generar_db  # noqa: E402
+
+# El benchmark hace muchos logins desde la misma IP/usuario: sin esto el rate
+# limit de /login respondería 429 y mediríamos el limitador, no el hash.
+ENTORNO_SERVIDOR = {
+    "RATE_IP_RAFAGA": "1000000",
+    "RATE_IP_POR_MIN": "1000000",
+    "RATE_USUARIO_RAFAGA": "1000000",
+    "RATE_USUARIO_POR_MIN": "1000000",
+    "SSE_MAX_CLIENTES": "0",
+    "METRICS_LOCALHOST": "1",   # escenario 'metrics' sin token
+}
+# Clave de edición de app/server.py (CLAVE_EDICION) y tamaño de los pedidos por lote
+CLAVE_EDICION = "Sanlorenzo"
+TAMANO_LOTE = 20
+
+# -----------------------------------------------------------------------------
+# ESCENARIOS: (nombre, función rnd → (método, ruta, json, form))
+# -----------------------------------------------------------------------------
+def escenarios(info: dict, escrituras: bool):
+    anio_desde, anio_hasta = info["anios"]
+    max_id = max(1, info["filas"]["tarea"])
+    n_secc = max(1, info["filas"]["seccionador"])
+    n_lados = max(1, info["filas"]["cromo"] // 4)
+
+    def anio(rnd):
+        return rnd.randint(anio_desde, anio_hasta)
+
+    def anual(ruta, rnd):
+        y = anio(rnd)
+        return f"{ruta}?start={y}-01-01&end={y + 1}-01-01"
+
+    def mes(rnd):
+        y, m = anio(rnd), rnd.randint(1, 12)
+        fin = date(y + (m == 12), m % 12 + 1, 1)
+        return f"/api/tareas?start={y}-{m:02d}-01&end={fin.isoformat()}"
+
+    def fecha(rnd):
+        return f"{anio(rnd)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+
+    def tarea(rnd):
+        marca, modelo = rnd.choice(generar_db.MARCAS)
+        return {"fecha": fecha(rnd), "ut": generar_db.ut_codigo(rnd.randrange(n_secc)),
+                "tarea": rnd.choice(generar_db.TAREAS), "tipo": rnd.choice(generar_db.TIPOS),
+                "horario": rnd.choice(generar_db.HORARIOS), "lugar": "SUBESTACIÓN",
+                "marca": marca, "modelo": modelo, "responsable": "BENCH",
+                "estado": rnd.choice(generar_db.ESTADOS), "comentario": "benchmark"}
+
+    lista = [
+        ("tareas_mes",      lambda rnd: ("GET", mes(rnd), None, None)),
+        ("tareas_anio",     lambda rnd: ("GET", anual("/api/tareas", rnd), None, None)),
+        ("tareas_todo",     lambda rnd: ("GET", "/api/tareas?all=1", None, None)),
+        ("tareas_stream",   lambda rnd: ("GET", "/api/tareas?all=1&stream=1", None, None)),
+        ("tarea_detalle",   lambda rnd: ("GET", f"/api/tareas/{rnd.randint(1, max_id)}", None, None)),
+        ("tareas_changes",  lambda rnd: ("GET", "/api/tareas/changes?since=0", None, None)),
+        ("tareas_search",   lambda rnd: ("GET", "/api/tareas/search?q=" + generar_db.ut_codigo(
+                                            rnd.randrange(n_secc))[:5], None, None)),
+        ("stats",           lambda rnd: ("GET", f"/api/stats?anio={anio(rnd)}", None, None)),
+        ("stats_ensayos",   lambda rnd: ("GET", f"/api/stats/ensayos?anio={anio(rnd)}", None, None)),
+        ("feriados",        lambda rnd: ("GET", anual("/api/feriados", rnd), None, None)),
+        ("ausencias",       lambda rnd: ("GET", anual("/api/ausencias", rnd), None, None)),
+        ("calendarios",     lambda rnd: ("GET", "/api/calendarios", None, None)),
+        ("feriados_anio",   lambda rnd: ("GET", f"/api/feriados/{anio(rnd)}.json", None, None)),
+        ("ubicacion_lookup", lambda rnd: ("GET", "/api/ubicacion_lookup?" + urllib.parse.urlencode(
+                                            {"ut": generar_db.ut_codigo(rnd.randrange(n_secc)),
+                                             "tipo": "RECONECTADOR"}), None, None)),
+        ("cromo",           lambda rnd: ("GET", "/api/cromo?lado=" + generar_db.lado_codigo(
+                                            rnd.randrange(n_lados)), None, None)),
+        ("metrics",         lambda rnd: ("GET", "/metrics", None, None)),
+        ("index",           lambda rnd: ("GET", "/", None, None)),
+        ("login",           lambda rnd: ("POST", "/login", None,
+                                         {"username": generar_db.USUARIO_BENCH,
+                                          "password": generar_db.CLAVE_BENCH})),
+    ]
+    # Modifican la base: para comparar dos corridas con escrituras, regenerarla
+    if escrituras:
+        lista += [
+            ("update_fecha",  lambda rnd: ("POST", "/api/update_fecha", {
+                "id": rnd.randint(1, max_id), "fecha": fecha(rnd), "clave": CLAVE_EDICION}, None)),
+            ("update_fechas", lambda rnd: ("POST", "/api/update_fechas", {
+                "items": [{"id": rnd.randint(1, max_id), "fecha": fecha(rnd)} for _ in range(TAMANO_LOTE)],
+                "clave": CLAVE_EDICION}, None)),
+            ("editar_tarea",  lambda rnd: ("POST", "/api/editar_tarea", {
+                "id_tarea": rnd.randint(1, max_id), **tarea(rnd), "clave": CLAVE_EDICION}, None)),
+            ("crear_tarea",   lambda rnd: ("POST", "/api/crear_tarea", {
+                **tarea(rnd), "clave": CLAVE_EDICION}, None)),
+            ("crear_tareas",  lambda rnd: ("POST", "/api/crear_tareas", {
+                "tareas": [tarea(rnd) for _ in range(TAMANO_LOTE)], "clave": CLAVE_EDICION}, None)),
+        ]
+    return lista
+
+# -----------------------------------------------------------------------------
+# CLIENTES (uno por hilo, cada uno con su sesión logueada)
+# -----------------------------------------------------------------------------
+class ClienteTest:
+    """Flask test client en proceso: mide la app sin red ni servidor WSGI."""
+
+    def __init__(self, app):
+        self.c = app.test_client()
+        self.pedir("POST", "/login", None, {"username": generar_db.USUARIO_BENCH,
+                                            "password": generar_db.CLAVE_BENCH})
+
+    def pedir(self, metodo, ruta, cuerpo, form):
+        r = self.c.open(ruta, method=metodo, json=cuerpo, data=form)
+        try:
+            n = sum(len(chunk) for chunk in r.response)   # consume también las respuestas transmitidas
+        finally:
+            r.close()
+        return r.status_code, n
+
+class _SinRedireccion(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class ClienteHTTP:
+    """Cliente urllib con cookies contra el waitress levantado por el benchmark."""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedireccion()
+        )
+        self.pedir("POST", "/login", None, {"username": generar_db.USUARIO_BENCH,
+                                            "password": generar_db.CLAVE_BENCH})
+
+    def pedir(self, metodo, ruta, cuerpo, form):
+        datos, headers = None, {}
+        if cuerpo is not None:
+            datos, headers = json.dumps(cuerpo).encode(), {"Content-Type": "application/json"}
+        elif form is not None:
+            datos = urllib.parse.urlencode(form).encode()
+        req = urllib.request.Request(self.base + ruta, data=datos, method=metodo, headers=headers)
+        try:
+            with self.opener.open(req, timeout=120) as r:
+                return r.status, len(r.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+# -----------------------------------------------------------------------------
+# MEDICIÓN
+# -----------------------------------------------------------------------------
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return None
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+def medir(nuevo_cliente, nombre, generador, requests_total, concurrencia, semilla):
+    locales = threading.local()
+    # Se loguea un cliente por hilo antes de medir
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        clientes = list(pool.map(lambda _: nuevo_cliente(), range(concurrencia)))
+    libres = list(clientes)
+    libres_lock = threading.Lock()
+
+    def cliente_del_hilo():
+        if not hasattr(locales, "c"):
+            with libres_lock:
+                locales.c = libres.pop()
+        return locales.c
+
+    rnd_lock = threading.Lock()
+    rnd = random.Random(semilla)
+    latencias, bytes_total, errores = [], 0, 0
+    res_lock = threading.Lock()
+
+    def una(_):
+        nonlocal bytes_total, errores
+        with rnd_lock:
+            metodo, ruta, cuerpo, form = generador(rnd)
+        c = cliente_del_hilo()
+        t0 = time.perf_counter()
+        status, n = c.pedir(metodo, ruta, cuerpo, form)
+        dt = time.perf_counter() - t0
+        with res_lock:
+            latencias.append(dt)
+            bytes_total += n
+            errores += status >= 400
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(requests_total)))
+    duracion = time.perf_counter() - t0
+
+    latencias.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "endpoint": nombre,
+        "concurrencia": concurrencia,
+        "requests": len(latencias),
+        "errores": errores,
+        "p50_ms": ms(percentil(latencias, 50)),
+        "p95_ms": ms(percentil(latencias, 95)),
+        "p99_ms": ms(percentil(latencias, 99)),
+        "max_ms": ms(latencias[-1] if latencias else None),
+        "rps": round(len(latencias) / duracion, 1) if duracion else None,
+        "bytes_prom": round(bytes_total / len(latencias)) if latencias else 0,
+    }
+
+def rss_pico_kb(pid=None):
+    """VmHWM de /proc (Linux). Sin pid: el proceso actual vía getrusage."""
+    if pid is None:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == "darwin" else rss   # macOS lo da en bytes
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return None
+
+# -----------------------------------------------------------------------------
+# MODOS
+# -----------------------------------------------------------------------------
+def correr_test(db, lista, args):
+    os.environ.update(ENTORNO_SERVIDOR, DB_PATH=db)
+    sys.path.insert(0, APP_DIR)
+    import server
+    server.iniciar_arranque(en_segundo_plano=False)   # como en producción: se mide ya precalentado
+
+    resultados = []
+    for conc in args.concurrencia:
+        for nombre, gen in lista:
+            if args.calentar:
+                ClienteTest(server.app).pedir(*gen(random.Random(0)))
+            r = medir(lambda: ClienteTest(server.app), nombre, gen, args.requests, conc, args.semilla)
+            resultados.append({"modo": "test", **r})
+            print(json.dumps(resultados[-1], ensure_ascii=False), file=sys.stderr)
+    return resultados, rss_pico_kb()
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def correr_waitress(db, lista, args):
+    puerto = _puerto_libre()
+    env = {**os.environ, **ENTORNO_SERVIDOR, "DB_PATH": db}
+    codigo = ("import server; from waitress import serve; server.iniciar_arranque(); "
+              f"serve(server.app, host='127.0.0.1', port={puerto}, threads={args.hilos}, "
+              f"connection_limit={max(100, max(args.concurrencia) * 2)})")
+    proc = subprocess.Popen([sys.executable, "-c", codigo], cwd=APP_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Se mide recién cuando /readyz da 200 (terminó el precalentamiento)
+        base = f"http://127.0.0.1:{puerto}"
+        limite = time.monotonic() + 60
+        while True:
+            try:
+                with urllib.request.urlopen(base + "/readyz", timeout=1):
+                    break
+            except OSError:   # incluye el 503 (HTTPError) mientras precalienta
+                if proc.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("waitress no levantó")
+                time.sleep(0.1)
+
+        resultados = []
+        for conc in args.concurrencia:
+            for nombre, gen in lista:
+                if args.calentar:
+                    ClienteHTTP(base).pedir(*gen(random.Random(0)))
+                r = medir(lambda: ClienteHTTP(base), nombre, gen, args.requests, conc, args.semilla)
+                resultados.append({"modo": "waitress", "hilos": args.hilos, **r})
+                print(json.dumps(resultados[-1], ensure_ascii=False), file=sys.stderr)
+        return resultados, rss_pico_kb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# -----------------------------------------------------------------------------
+# MAIN
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints contra una base sintética")
+    parser.add_argument("--db", default=os.path.join(BENCH_DIR, "telecontrol_bench.sqlite"),
+                        help="base a usar; se genera si no existe o con --regenerar")
+    parser.add_argument("--regenerar", action="store_true")
+    parser.add_argument("--modo", choices=["test", "waitress", "ambos"], default="ambos")
+    parser.add_argument("--concurrencia", default="1,8", help="lista separada por comas")
+    parser.add_argument("--requests", type=int, default=100, help="requests por endpoint y concurrencia")
+    parser.add_argument("--hilos", type=int, default=8, help="hilos de waitress")
+    parser.add_argument("--endpoints", default="", help="filtrar escenarios (lista separada por comas)")
+    parser.add_argument("--escrituras", action="store_true", help="incluye los endpoints de edición (mover, editar y crear tareas, también por lote)")
+    parser.add_argument("--sin-calentar", dest="calentar", action="store_false")
+    parser.add_argument("--salida", default="", help="archivo JSON (además de stdout)")
+    generar_db.argumentos(parser)
+    args = parser.parse_args()
+    args.concurrencia = [int(x) for x in args.concurrencia.split(",") if x.strip()]
+
+    if args.regenerar or not os.path.exists(args.db):
+        info = generar_db.generar(args.db, **generar_db.opciones_generador(args))
+    else:
+        with sqlite3.connect(args.db) as conn:
+            filas = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                     for t in ("tarea", "ausencia", "feriado", "usuario", "centro", "seccionador", "cromo", "ruta")}
+            anios = conn.execute("SELECT MIN(substr(fecha, 1, 4)), MAX(substr(fecha, 1, 4)) FROM tarea").fetchone()
+        info = {"ruta": args.db, "bytes": os.path.getsize(args.db), "filas": filas,
+                "anios": [int(anios[0] or date.today().year), int(anios[1] or date.today().year)]}
+
+    lista = escenarios(info, args.escrituras)
+    if args.endpoints:
+        pedidos = set(args.endpoints.split(","))
+        lista = [e for e in lista if e[0] in pedidos]
+
+    reporte = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "db": info,
+        "config": {k: getattr(args, k) for k in ("modo", "concurrencia", "requests", "hilos",
+                                                 "escrituras", "calentar", "semilla")},
+        "resultados": [],
+        "rss_pico_kb": {},
+    }
+    # waitress primero: el modo test importa la app en este proceso
+    if args.modo in ("waitress", "ambos"):
+        res, rss = correr_waitress(args.db, lista, args)
+        reporte["resultados"] += res
+        reporte["rss_pico_kb"]["waitress"] = rss
+    if args.modo in ("test", "ambos"):
+        res, rss = correr_test(args.db, lista, args)
+        reporte["resultados"] += res
+        reporte["rss_pico_kb"]["test"] = rss
+
+    salida = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida + "\n")
+    print(salida)
+
+if __name__ == "__main__":
+    main()
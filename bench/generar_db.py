@@ -0,0 +1,198 @@
+"""
+===============================================================================
+ Generador de base sintética (telecontrol.sqlite) para benchmarks
+ - Mismas tablas y columnas que usa app/server.py
+ - Tamaños configurables y semilla fija → bases reproducibles
+===============================================================================
+Uso:
+    python bench/generar_db.py --salida bench/telecontrol_bench.sqlite --tareas 200000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+# Usuario que crea el generador (lo usa benchmark.py para loguearse)
+USUARIO_BENCH = "bench"
+CLAVE_BENCH = "bench1234"
+
+ESQUEMA = """
+CREATE TABLE tarea (
+    id_tarea      INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha         TEXT,
+    horario       TEXT,
+    ut            TEXT,
+    tarea         TEXT,
+    tipo          TEXT,
+    lugar         TEXT,
+    pedido        TEXT,
+    marca         TEXT,
+    modelo        TEXT,
+    ajuste        TEXT,
+    responsable   TEXT,
+    estado        TEXT,
+    comentario    TEXT,
+    tx_zona       INTEGER,
+    rx_zona       INTEGER,
+    tx_protection INTEGER,
+    rx_protection INTEGER,
+    lado          TEXT,
+    cuenta        TEXT,
+    zona          TEXT,
+    partido       TEXT,
+    locked_by     TEXT
+);
+CREATE TABLE ausencia (id INTEGER PRIMARY KEY, fecha TEXT, usuario TEXT);
+CREATE TABLE feriado  (id INTEGER PRIMARY KEY, fecha TEXT, title TEXT);
+CREATE TABLE usuario (
+    id_usuario          INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre_usuario      TEXT NOT NULL,
+    clave_hash          TEXT NOT NULL,
+    rol                 TEXT,
+    activo              INTEGER DEFAULT 1,
+    intentos_fallidos   INTEGER DEFAULT 0,
+    bloqueado_hasta     TEXT,
+    ultimo_login        TEXT,
+    fecha_actualizacion TEXT
+);
+CREATE TABLE centro      ("Ubicac.técnica" TEXT, "Área de empresa" TEXT, "Población" TEXT, "Distrito" TEXT);
+CREATE TABLE seccionador ("Ubicac.técnica" TEXT, "Área de empresa" TEXT, "Población" TEXT, "Distrito" TEXT);
+CREATE TABLE cromo (UT TEXT, Cuenta TEXT, Lado TEXT, Clase TEXT, Celda TEXT, "Conexión" TEXT);
+CREATE TABLE ruta  (UT TEXT, Carpeta TEXT);
+"""
+
+TAREAS = ["ENSAYO", "AJUSTE", "EVENTOS", "FUNCIÓN", "ACTUALIZAR", "REVISIÓN"]
+TIPOS = ["RECONECTADOR", "SECCIONADOR", "CENTRO"]
+ESTADOS = ["EJECUTADO", "PROGRAMADO", "REPROGRAMADO", "SUSPENDIDO"]
+MARCAS = [("ABB", "OVR3"), ("NOJA", "OSM15"), ("SCHNEIDER", "U27"), ("ENTEC", "ETR300")]
+HORARIOS = ["SIN HORARIO", "08:00", "10:00", "14:00"]
+DISTRITOS = ["NORTE", "SUR", "OESTE", "CENTRO"]
+
+def ut_codigo(i: int) -> str:
+    return f"R-{i:05d}"
+
+def lado_codigo(i: int) -> str:
+    return f"L-{i:04d}"
+
+def _lotes(filas, n=5000):
+    lote = []
+    for f in filas:
+        lote.append(f)
+        if len(lote) >= n:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def generar(salida: str, tareas: int, anios: int, ausencias: int, feriados: int, usuarios: int,
+            centros: int, seccionadores: int, cromos: int, rutas: int, semilla: int) -> dict:
+    rnd = random.Random(semilla)
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(salida + ext):
+            os.remove(salida + ext)
+
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(salida)
+    conn.executescript(ESQUEMA)
+
+    hasta = date.today().replace(month=12, day=31)
+    desde = date(hasta.year - anios + 1, 1, 1)
+    dias = (hasta - desde).days + 1
+    n_ut = max(1, seccionadores + centros)
+    n_lados = max(1, cromos // 4)
+
+    def filas_tarea():
+        for i in range(tareas):
+            f = desde + timedelta(days=rnd.randrange(dias))
+            marca, modelo = rnd.choice(MARCAS)
+            j = rnd.randrange(n_ut)
+            yield (
+                f"{f.isoformat()} 00:00:00", rnd.choice(HORARIOS),
+                ut_codigo(j) if j < seccionadores else f"C-{j:05d}",
+                rnd.choice(TAREAS), rnd.choice(TIPOS), "SUBESTACIÓN", f"P{i:07d}",
+                marca, modelo, f"AJ-{rnd.randrange(999):03d}", "RESPONSABLE", rnd.choice(ESTADOS),
+                "Comentario de prueba " * rnd.randrange(1, 6),
+                rnd.randrange(2), rnd.randrange(2), rnd.randrange(2), rnd.randrange(2),
+                lado_codigo(rnd.randrange(n_lados)), str(rnd.randrange(100000)),
+                rnd.choice(DISTRITOS), "PARTIDO",
+            )
+
+    for lote in _lotes(filas_tarea()):
+        conn.executemany("""
+            INSERT INTO tarea (fecha, horario, ut, tarea, tipo, lugar, pedido, marca, modelo, ajuste,
+                               responsable, estado, comentario, tx_zona, rx_zona, tx_protection,
+                               rx_protection, lado, cuenta, zona, partido)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, lote)
+
+    conn.executemany("INSERT INTO feriado (fecha, title) VALUES (?, ?)", (
+        ((desde + timedelta(days=rnd.randrange(dias))).isoformat(), f"Feriado {i}") for i in range(feriados)
+    ))
+    conn.executemany("INSERT INTO ausencia (fecha, usuario) VALUES (?, ?)", (
+        ((desde + timedelta(days=rnd.randrange(dias))).isoformat(), f"usuario{i % max(1, usuarios)}")
+        for i in range(ausencias)
+    ))
+
+    # Un solo hash para todos: generar miles con scrypt llevaría minutos
+    clave_hash = generate_password_hash(CLAVE_BENCH)
+    conn.execute("INSERT INTO usuario (nombre_usuario, clave_hash, rol, activo) VALUES (?, ?, 'admin', 1)",
+                 (USUARIO_BENCH, clave_hash))
+    conn.executemany("INSERT INTO usuario (nombre_usuario, clave_hash, rol, activo) VALUES (?, ?, 'user', 1)",
+                     ((f"usuario{i}", clave_hash) for i in range(max(0, usuarios - 1))))
+
+    conn.executemany('INSERT INTO seccionador VALUES (?, ?, ?, ?)', (
+        (ut_codigo(i), "EMPRESA", f"Población {i % 50}", rnd.choice(DISTRITOS)) for i in range(seccionadores)
+    ))
+    conn.executemany('INSERT INTO centro VALUES (?, ?, ?, ?)', (
+        (f"C-{seccionadores + i:05d}", "EMPRESA", f"Población {i % 50}", rnd.choice(DISTRITOS))
+        for i in range(centros)
+    ))
+    conn.executemany('INSERT INTO cromo VALUES (?, ?, ?, ?, ?, ?)', (
+        (str(i % max(1, rutas)), str(rnd.randrange(100000)), lado_codigo(i % n_lados), "CLASE",
+         f"CELDA {i % 12}", "CONEXIÓN") for i in range(cromos)
+    ))
+    conn.executemany('INSERT INTO ruta VALUES (?, ?)', (
+        (str(i), f"\\\\servidor\\rutas\\{i:05d}") for i in range(rutas)
+    ))
+    conn.commit()
+
+    conteos = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+               for t in ("tarea", "ausencia", "feriado", "usuario", "centro", "seccionador", "cromo", "ruta")}
+    conn.close()
+    return {
+        "ruta": salida,
+        "bytes": os.path.getsize(salida),
+        "filas": conteos,
+        "anios": [desde.year, hasta.year],
+        "generada_en_s": round(time.perf_counter() - t0, 2),
+    }
+
+def argumentos(parser: argparse.ArgumentParser):
+    parser.add_argument("--tareas", type=int, default=20000)
+    parser.add_argument("--anios", type=int, default=5, help="años de historial hasta el actual")
+    parser.add_argument("--ausencias", type=int, default=2000)
+    parser.add_argument("--feriados", type=int, default=100)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--centros", type=int, default=5000)
+    parser.add_argument("--seccionadores", type=int, default=5000)
+    parser.add_argument("--cromos", type=int, default=20000)
+    parser.add_argument("--rutas", type=int, default=5000)
+    parser.add_argument("--semilla", type=int, default=1234)
+
+def opciones_generador(args) -> dict:
+    return {k: getattr(args, k) for k in ("tareas", "anios", "ausencias", "feriados", "usuarios",
+                                          "centros", "seccionadores", "cromos", "rutas", "semilla")}
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description="Genera una base SQLite sintética para benchmarks")
+    parser.add_argument("--salida", default="bench/telecontrol_bench.sqlite")
+    argumentos(parser)
+    args = parser.parse_args()
+    print(json.dumps(generar(args.salida, **opciones_generador(args)), indent=2, ensure_ascii=False))